@@ -0,0 +1,69 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative time allowed for `import app` in a fresh interpreter, in
+# milliseconds, and the libraries that importing it must not load: each app
+# imports them on first use
+BUDGETS = {
+    'seat_allocation': 500,
+    'marks_analysis': 500,
+    'sa_value_optimization': 1200,
+    'time_table_gen': 1200,
+}
+LAZY_MODULES = {
+    'seat_allocation': ('matplotlib', 'scipy', 'networkx', 'ortools', 'pandas'),
+    'marks_analysis': ('matplotlib', 'scipy', 'networkx', 'ortools', 'pandas'),
+    'sa_value_optimization': ('matplotlib', 'scipy', 'networkx', 'ortools'),
+    'time_table_gen': ('matplotlib', 'scipy', 'networkx', 'ortools'),
+}
+
+# One line of -X importtime output: self and cumulative microseconds, then
+# the module name indented by its nesting depth
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+# Import app in a fresh interpreter inside its directory; returns the
+# cumulative import time of app in ms and the names of all modules loaded
+def import_profile(app_dir):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=os.path.join(ROOT, app_dir),
+                            capture_output=True, text=True, check=True)
+    total, modules = None, set()
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        modules.add(match[4])
+        if match[4] == 'app' and not match[3]:
+            total = int(match[2]) / 1000
+    return total, modules
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the cold import time of every app against its budget.')
+    parser.add_argument('--apps', nargs='+', choices=list(BUDGETS), default=list(BUDGETS))
+    parser.add_argument('--repeat', type=int, default=5, help='imports per app; the fastest one is checked')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply every budget, for slower machines')
+    args = parser.parse_args()
+
+    failed = False
+    for app_dir in args.apps:
+        profiles = [import_profile(app_dir) for _ in range(args.repeat)]
+        total = min(total for total, _ in profiles)
+        budget = BUDGETS[app_dir] * args.scale
+        eager = sorted({module.split('.')[0] for module in profiles[0][1]} & set(LAZY_MODULES[app_dir]))
+        print(f'{app_dir:<24} {total:8.1f} ms  (budget {budget:.0f} ms)')
+        if total > budget:
+            print(f'OVER BUDGET {app_dir}: {total:.1f} ms > {budget:.0f} ms')
+            failed = True
+        if eager:
+            print(f'EAGER IMPORT {app_dir}: {", ".join(eager)} loaded by import app')
+            failed = True
+    if failed:
+        raise SystemExit(1)
+    print('All apps within their import budgets')
+
+if __name__ == '__main__':
+    main()
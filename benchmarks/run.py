@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+
+# The kernels live next to each app; their module names do not collide.
+# The root holds the common package the apps share.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+for app_dir in ('seat_allocation', 'marks_analysis', 'sa_value_optimization', 'time_table_gen'):
+    sys.path.insert(0, os.path.join(ROOT, app_dir))
+
+# Timetable workloads come from the seeded generator of the timetable datasets
+sys.path.insert(0, os.path.join(ROOT, 'time_table_gen', 'data'))
+
+import numpy as np
+import pandas as pd
+
+import workloads
+from aggregates import CourseAggregates
+from analysis import SA_RANGES, _normality_of_counts, analyze_distributions
+from annealing import objective_function, simulated_annealing
+from coloring import dsatur
+from conflicts import conflict_graph
+from data_gen import enrolment_table
+from marks_stats import MarksStatistics
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Quality metrics where a larger value is better; for all others smaller is better
+HIGHER_IS_BETTER = {'best_p_value'}
+
+# Each timing round repeats the kernel for at least this long, and peak
+# memory may grow by this much on top of the relative threshold, so tiny
+# kernels do not fail on timer and allocator noise
+MIN_ROUND_SECONDS = 0.2
+MEMORY_SLACK_MB = 1.0
+
+# Large grade samples are the point of the SA workloads
+warnings.filterwarnings('ignore', message='scipy.stats.shapiro: For N > 5000')
+
+# Each case prepares its seeded workload, then returns a run function that
+# executes the kernel once and returns (items processed, quality metrics).
+
+def seat_annealing(scale, seed):
+    n = workloads.SEAT_SIZES[scale]
+    courses = workloads.seat_courses(n, seed)
+    students = list(range(n))
+
+    def run():
+        _, best_cost = simulated_annealing(students, courses, max_iterations=workloads.SEAT_ITERATIONS, seed=seed)
+        return workloads.SEAT_ITERATIONS, {'conflicts': best_cost}
+    return run
+
+def seat_objective(scale, seed):
+    n = workloads.SEAT_SIZES[scale]
+    courses = workloads.seat_courses(n, seed)
+    assignment = list(range(n))
+
+    def run():
+        return n, {'conflicts': objective_function(assignment, courses)}
+    return run
+
+def marks_course_analysis(scale, seed):
+    marks = workloads.marks(workloads.MARKS_SIZES[scale], seed)
+    exact_median = float(np.median(marks))
+
+    def run():
+        stats = CourseAggregates()  # Exact quartiles, as the app serves by default
+        stats.update(marks)
+        _ = (stats.mean, stats.stddev, stats.q1, stats.q3, stats.above_average, stats.below_average,
+             stats.range_distribution)
+        return len(marks), {'median_relative_error': abs(stats.median - exact_median) / exact_median}
+    return run
+
+def marks_person_performance(scale, seed):
+    marks = workloads.marks(workloads.MARKS_SIZES[scale], seed)
+
+    def run():
+        stats = MarksStatistics(marks)
+        stats.ranks(marks)
+        stats.quantile_index(marks)
+        return len(marks), {}
+    return run
+
+def sa_analyze_distributions(scale, seed):
+    df = pd.DataFrame({'Marks': workloads.marks(workloads.SA_SIZES[scale], seed)})
+
+    def run():
+        _normality_of_counts.cache_clear()  # Time the tests, not the memo
+        best = 0.0
+        for st, en in SA_RANGES:
+            _, p_value, _ = analyze_distributions(df, st, en, 9)
+            best = max(best, float(p_value))
+        return sum(en - st for st, en in SA_RANGES), {'best_p_value': best}
+    return run
+
+def timetable_colouring(scale, seed):
+    students, courses = workloads.TIMETABLE_SIZES[scale]
+    student_data = enrolment_table(students, courses, workloads.COURSES_PER_STUDENT, seed)
+
+    def run():
+        slots, _ = dsatur(conflict_graph(student_data))
+        return students, {'slots': max(slots.values()) + 1}
+    return run
+
+CASES = {
+    'seat.simulated_annealing': seat_annealing,
+    'seat.objective_function': seat_objective,
+    'marks.course_analysis': marks_course_analysis,
+    'marks.person_performance': marks_person_performance,
+    'sa.analyze_distributions': sa_analyze_distributions,
+    'timetable.conflicts_dsatur': timetable_colouring,
+}
+
+# Best time per run over `repeat` rounds of at least MIN_ROUND_SECONDS, then
+# one more run under tracemalloc for the peak of Python-visible allocations
+# (NumPy buffers included). An untimed first run loads the libraries the
+# apps import on first use.
+def measure(run, repeat):
+    run()
+    seconds = float('inf')
+    for _ in range(repeat):
+        runs = 0
+        start = time.perf_counter()
+        while True:
+            items, quality = run()
+            runs += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_ROUND_SECONDS:
+                break
+        seconds = min(seconds, elapsed / runs)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': seconds, 'throughput': items / seconds, 'peak_mb': peak / 2 ** 20, 'quality': quality}
+
+# Regressions of one result against its baseline entry, as messages
+def regressions(result, baseline, threshold, quality_threshold):
+    found = []
+    for metric, slack in (('seconds', 0), ('peak_mb', MEMORY_SLACK_MB)):
+        limit = baseline[metric] * (1 + threshold) + slack
+        if result[metric] > limit:
+            found.append(f'{metric} {result[metric]:.4g} > {limit:.4g} (baseline {baseline[metric]:.4g})')
+    for metric, base in baseline['quality'].items():
+        value = result['quality'].get(metric)
+        if value is None:
+            continue
+        tolerance = abs(base) * quality_threshold
+        worse = value < base - tolerance if metric in HIGHER_IS_BETTER else value > base + tolerance
+        if worse:
+            found.append(f'{metric} {value:.6g} vs baseline {base:.6g}')
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the core kernels of every app against a baseline.')
+    parser.add_argument('--scales', nargs='+', choices=workloads.SCALES, default=['small', 'medium'])
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed relative increase of time and peak memory')
+    parser.add_argument('--quality-threshold', type=float, default=0.0,
+                        help='allowed relative worsening of solution quality')
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'case':<40} {'seconds':>9} {'items/s':>12} {'peak MB':>9}  quality")
+    for name in args.cases:
+        for scale in args.scales:
+            key = f'{name}[{scale}]'
+            results[key] = measure(CASES[name](scale, args.seed), args.repeat)
+            r = results[key]
+            print(f"{key:<40} {r['seconds']:>9.4f} {r['throughput']:>12.4g} {r['peak_mb']:>9.1f}  "
+                  + ', '.join(f'{k}={v:.6g}' for k, v in r['quality'].items()))
+
+    if args.update:
+        stored = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline) as f:
+                stored = json.load(f)
+        stored.setdefault('results', {}).update(results)
+        stored['machine'] = {'python': platform.python_version(), 'platform': platform.platform(),
+                             'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count()}
+        with open(args.baseline, 'w') as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+        print(f'Baseline written to {args.baseline}')
+        return
+
+    if not os.path.isfile(args.baseline):
+        raise SystemExit(f'No baseline at {args.baseline}; run with --update first')
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+
+    failed = False
+    for key, result in results.items():
+        if key not in baseline:
+            print(f'{key}: no baseline entry, skipped')
+            continue
+        for message in regressions(result, baseline[key], args.threshold, args.quality_threshold):
+            print(f'REGRESSION {key}: {message}')
+            failed = True
+    if failed:
+        raise SystemExit(1)
+    print('No regressions')
+
+if __name__ == '__main__':
+    main()
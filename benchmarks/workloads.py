@@ -0,0 +1,28 @@
+import numpy as np
+
+# Course names drawn for seat allocation workloads, as in seat_allocation/data/data_gen.py
+SEAT_COURSES = ['DL', 'ML', 'AI', 'DB', 'WE', 'OS', 'SE']
+
+# Students per seat allocation workload and annealing iterations per run
+SEAT_SIZES = {'small': 1000, 'medium': 10000, 'large': 50000}
+SEAT_ITERATIONS = 20000
+
+# Marks per course for the marks_analysis and sa_value_optimization workloads
+MARKS_SIZES = {'small': 10000, 'medium': 100000, 'large': 1000000}
+SA_SIZES = {'small': 1000, 'medium': 10000, 'large': 100000}
+
+# (students, courses) of the timetable workloads and mean courses taken by each student
+TIMETABLE_SIZES = {'small': (1000, 100), 'medium': (5000, 500), 'large': (30000, 2000)}
+COURSES_PER_STUDENT = 6
+
+SCALES = list(SEAT_SIZES)
+
+# Course label of every student, drawn uniformly
+def seat_courses(n, seed):
+    rng = np.random.default_rng(seed)
+    return [SEAT_COURSES[i] for i in rng.integers(0, len(SEAT_COURSES), n)]
+
+# Integer marks from 0 to 100 around a mean of 60, like the sample data
+def marks(n, seed):
+    rng = np.random.default_rng(seed)
+    return np.clip(np.rint(rng.normal(60, 15, n)), 0, 100).astype(np.int64)
@@ -0,0 +1 @@
+"""Modules shared by every app: metrics, jobs, upload ingest and data generation helpers."""
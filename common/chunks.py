@@ -0,0 +1,24 @@
+# Write DataFrame chunks to one CSV file, or to one Parquet file when fmt is
+# 'parquet' or the path ends in .parquet, holding a single chunk in memory
+# at a time. Returns the number of rows written.
+def write_chunks(chunks, path, fmt=None):
+    fmt = fmt or ('parquet' if path.endswith('.parquet') else 'csv')
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            if fmt == 'parquet':
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+            else:
+                chunk.to_csv(path, mode='a' if rows else 'w', header=not rows, index=False)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
@@ -0,0 +1,204 @@
+from collections import OrderedDict
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+from common.metrics import stage
+
+# Bytes of parsed uploads kept in memory per process
+DEFAULT_CACHE_BYTES = 256 * 2 ** 20
+
+# Uploads at least this large are spooled to disk and parsed memory-mapped
+MMAP_THRESHOLD = 8 * 2 ** 20
+
+# Bytes read (and hashed) at a time from an upload stream
+READ_CHUNK = 2 ** 20
+
+# Upload formats by leading magic bytes; anything else is read as CSV
+MAGIC = [(b'PAR1', 'parquet'), (b'ARROW1', 'arrow')]
+EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+class Upload:
+    """The bytes of one uploaded file, with their SHA-256 and format.
+
+    Small uploads stay in memory as `data`; larger ones are spooled to a
+    temporary file at `path`, so they can be parsed memory-mapped. source
+    is whichever of the two is set.
+    """
+
+    def __init__(self, digest, fmt, data=None, path=None):
+        self.digest = digest
+        self.format = fmt
+        self.data = data
+        self.path = path
+
+    @property
+    def source(self):
+        return self.path if self.path is not None else self.data
+
+    # Move or write the upload to path, which then owns the bytes
+    def save(self, path):
+        if self.path is not None:
+            os.replace(self.path, path)
+            self.path = path
+        else:
+            with open(path, 'wb') as f:
+                f.write(self.data)
+
+    # Remove the spooled file, if any
+    def discard(self):
+        if self.path is not None and os.path.basename(self.path).startswith('.spool-'):
+            os.remove(self.path)
+            self.path = None
+
+# Read an uploaded file stream once, hashing it on the way. Returns an
+# Upload in memory, or spooled under spool_dir (the system temporary
+# directory when None) from mmap_threshold bytes on.
+def receive(file, spool_dir=None, mmap_threshold=MMAP_THRESHOLD):
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    spool = None
+    head = b''
+    for chunk in iter(lambda: file.stream.read(READ_CHUNK), b''):
+        digest.update(chunk)
+        if len(head) < 8:
+            head += chunk[:8]
+        if spool is None and buffer.tell() + len(chunk) >= mmap_threshold:
+            if spool_dir is not None:
+                os.makedirs(spool_dir, exist_ok=True)
+            spool = tempfile.NamedTemporaryFile(dir=spool_dir, prefix='.spool-', delete=False)
+            spool.write(buffer.getvalue())
+            buffer = None
+        (spool or buffer).write(chunk)
+
+    fmt = detect_format(head, getattr(file, 'filename', None))
+    if spool is None:
+        return Upload(digest.hexdigest(), fmt, data=buffer.getvalue())
+    spool.close()
+    return Upload(digest.hexdigest(), fmt, path=spool.name)
+
+# 'parquet', 'arrow' or 'csv', from the magic bytes of a file and then its name
+def detect_format(head, filename=None):
+    for magic, fmt in MAGIC:
+        if head.startswith(magic):
+            return fmt
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    if extension in ('.arrow', '.feather'):
+        return 'arrow'
+    return 'csv'
+
+# Read a CSV, Parquet or Arrow IPC file (a path or bytes) into a DataFrame.
+# Only the given columns that exist are read; the caller checks for missing
+# ones. Paths are memory-mapped, so large files are paged in as parsed
+# rather than copied in first. dtype applies to columns that were read.
+def read_frame(source, fmt, columns=None, dtype=None):
+    import pandas as pd
+
+    if fmt == 'csv':
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        usecols = (lambda column: column in columns) if columns is not None else None
+        return pd.read_csv(source, usecols=usecols, dtype=dtype, encoding='utf-8-sig',
+                           memory_map=isinstance(source, str) and os.path.getsize(source) > 0)
+
+    import pyarrow as pa
+    stream = pa.memory_map(source) if isinstance(source, str) else pa.BufferReader(source)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(stream)
+    else:
+        table = pa.ipc.open_file(stream).read_all()
+    if columns is not None:
+        table = table.select([column for column in table.column_names if column in columns])
+    df = table.to_pandas()
+    if dtype:
+        df = df.astype({column: kind for column, kind in dtype.items() if column in df.columns})
+    return df
+
+# Marks as float32 when that represents every value exactly (whole and
+# half marks, for instance), float64 otherwise; integer marks are kept
+def compact_marks(values):
+    values = np.asarray(values)
+    if values.dtype.kind == 'f' and values.dtype != np.float32:
+        narrow = values.astype(np.float32)
+        if np.array_equal(narrow, values, equal_nan=True):
+            return narrow
+    return values
+
+class FrameCache:
+    """Parsed uploads keyed by the SHA-256 of their bytes.
+
+    load() hashes an upload while reading it; when the same bytes were
+    parsed before for the same kind, the parsed value is returned and
+    parsing is skipped entirely. Values are kept least recently used first
+    out within max_bytes of memory. They are shared between requests:
+    NumPy arrays are made read-only and callers must not modify frames.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, spool_dir=None):
+        self.max_bytes = max_bytes
+        self.spool_dir = spool_dir
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    # Parsed value of an uploaded file: parse(upload) runs on a miss only
+    def load(self, file, kind, parse):
+        with stage('receive_upload'):
+            upload = receive(file, self.spool_dir)
+        key = (upload.digest, kind)
+        try:
+            with self._lock:
+                if key in self._values:
+                    self._values.move_to_end(key)
+                    self.hits += 1
+                    return self._values[key][0]
+                self.misses += 1
+            with stage('parse_upload'):
+                value = parse(upload)
+        finally:
+            upload.discard()
+
+        _freeze(value)
+        size = _size(value)
+        with self._lock:
+            if size <= self.max_bytes and key not in self._values:
+                self._values[key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted) = self._values.popitem(last=False)
+                    self._bytes -= evicted
+        return value
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._values),
+                    'bytes': self._bytes, 'maxBytes': self.max_bytes}
+
+def _freeze(value):
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            _freeze(item)
+
+# Approximate memory held by a parsed value, strings included
+def _size(value):
+    if hasattr(value, 'memory_usage'):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(sys.getsizeof(item) for item in value.flat)
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_size(item) for item in value)
+    return sys.getsizeof(value)
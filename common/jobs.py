@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import uuid
+
+# Jobs run at the same time, and seconds a finished job is kept
+DEFAULT_JOB_WORKERS = 2
+DEFAULT_JOB_TTL = 3600
+
+class JobCancelled(Exception):
+    """Raised from a job's progress callback once the job is cancelled."""
+
+class Job:
+    """One background run: its state, latest progress and result.
+
+    The work function receives report() as its progress callback. Every call
+    replaces the progress fields it names and is also where a cancelled job
+    stops, by raising JobCancelled.
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.state = 'queued'  # queued, running, done, failed or cancelled
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._cancelled = threading.Event()
+
+    def report(self, **progress):
+        if self._cancelled.is_set():
+            raise JobCancelled()
+        self.progress = {**self.progress, **progress}
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def to_dict(self):
+        return {'id': self.id, 'state': self.state, 'progress': self.progress, 'error': self.error,
+                'created': self.created, 'finished': self.finished}
+
+class JobManager:
+    """Runs jobs on a bounded thread pool and keeps them for ttl seconds
+    after they finish."""
+
+    def __init__(self, max_workers=DEFAULT_JOB_WORKERS, ttl=DEFAULT_JOB_TTL):
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    # Queue fn(*args, progress=job.report, **kwargs) and return its Job
+    def submit(self, fn, *args, **kwargs):
+        self._purge()
+        job = Job()
+        with self._lock:
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancelled:
+            job.state, job.finished = 'cancelled', time.time()
+            return
+        job.state = 'running'
+        try:
+            job.result = fn(*args, progress=job.report, **kwargs)
+            job.state = 'done'
+        except JobCancelled:
+            job.state = 'cancelled'
+        except Exception as e:
+            job.error = str(e)
+            job.state = 'failed'
+        job.finished = time.time()
+
+    # Job by id, or None when unknown or expired
+    def get(self, job_id):
+        self._purge()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    # Ask a job to stop; a queued job never starts. Returns the job or None.
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def _purge(self):
+        expiry = time.time() - self.ttl
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.finished is not None and job.finished < expiry]:
+                del self._jobs[job_id]
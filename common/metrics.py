@@ -0,0 +1,244 @@
+import bisect
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+
+from flask import Response, g, jsonify, request
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Request header asking for a profile of that request: 'cpu', 'memory' or 'all'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_KINDS = {'cpu': (True, False), 'memory': (False, True), 'all': (True, True)}
+
+# Lines kept in the text summary of a profile
+PROFILE_TOP = 40
+
+_PROFILE_ID = re.compile(r'^[0-9]+-[0-9a-f]{8}$')
+
+class Histogram:
+    """Prometheus-style histogram with one series per tuple of label values.
+
+    Bucket counts are stored per bucket and only made cumulative when
+    rendered, so observe() is one binary search and a few additions.
+    """
+
+    def __init__(self, name, help, labels, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bucket] += 1
+            series[-1] += value
+
+    # Lines of the Prometheus text exposition format
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for label_values, values in series:
+            labels = ','.join(f'{label}="{_escape(value)}"' for label, value in zip(self.labels, label_values))
+            prefix = labels + ',' if labels else ''
+            braces = f'{{{labels}}}' if labels else ''
+            total = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                total += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {total}')
+            lines.append(f'{self.name}_sum{braces} {values[-1]}')
+            lines.append(f'{self.name}_count{braces} {total}')
+        return lines
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Histograms of this process. Like the job pools they are per process: with
+# several workers, each one reports its own requests.
+REQUEST_DURATION = Histogram('http_request_duration_seconds',
+                             'Time from the start of a request until its view returned.',
+                             ('method', 'route', 'status'))
+STAGE_DURATION = Histogram('stage_duration_seconds', 'Time spent in each named stage of the work.', ('stage',))
+HISTOGRAMS = [REQUEST_DURATION, STAGE_DURATION]
+
+# Context manager adding the time spent in its block to STAGE_DURATION,
+# in requests and background jobs alike:
+#
+#     with stage('read_csv'):
+#         df = pd.read_csv(path)
+def stage(name):
+    return _StageTimer(name)
+
+class _StageTimer:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        STAGE_DURATION.observe(time.perf_counter() - self.start, self.name)
+
+class Profiler:
+    """Opt-in cProfile and tracemalloc capture of single requests.
+
+    A request is profiled when it carries the PROFILE_HEADER, or at random
+    with probability sample_rate. One request is profiled at a time, since
+    tracemalloc is process-wide; others go unprofiled meanwhile. cProfile
+    only sees the request's own thread, so work handed to a background job
+    is not in the profile, while tracemalloc counts every thread.
+
+    Each capture is written to directory as <id>.prof (a pstats dump of the
+    CPU profile) and <id>.txt (top functions and allocating lines), and its
+    id is returned in the PROFILE_HEADER response header.
+    """
+
+    def __init__(self, directory, sample_rate=0.0):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self._busy = threading.Lock()
+
+    # Start profiling the current request if asked to; sets g.profile
+    def start(self):
+        kind = request.headers.get(PROFILE_HEADER)
+        if kind is None:
+            if not self.sample_rate or random.random() >= self.sample_rate:
+                return
+            kind = 'cpu'
+        cpu, memory = PROFILE_KINDS.get(kind.lower(), (False, False))
+        if not (cpu or memory) or not self._busy.acquire(blocking=False):
+            return
+        memory = memory and not tracemalloc.is_tracing()  # Leave tracing started elsewhere alone
+        if not (cpu or memory):
+            self._busy.release()
+            return
+        if memory:
+            tracemalloc.start()
+        profile = cProfile.Profile() if cpu else None
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:  # Another profiler is active in this process
+                profile = None
+        if profile is None and not memory:
+            self._busy.release()
+            return
+        g.profile = (profile, memory)
+
+    # Stop the profile of the current request, if any, and save it unless
+    # the request failed. Returns the profile id or None.
+    def stop(self, save=True):
+        profile, memory = g.pop('profile', (None, False))
+        if profile is None and not memory:
+            return None
+        try:
+            if profile is not None:
+                profile.disable()
+            snapshot = peak = None
+            if memory:
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            return self._save(profile, snapshot, peak) if save else None
+        finally:
+            self._busy.release()
+
+    def _save(self, profile, snapshot, peak):
+        profile_id = f'{int(time.time())}-{uuid.uuid4().hex[:8]}'
+        os.makedirs(self.directory, exist_ok=True)
+        summary = io.StringIO()
+        summary.write(f'{request.method} {request.path}\n\n')
+        if profile is not None:
+            profile.dump_stats(os.path.join(self.directory, f'{profile_id}.prof'))
+            pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(PROFILE_TOP)
+        if snapshot is not None:
+            summary.write(f'Peak traced memory: {peak / 2 ** 20:.1f} MiB\n\n')
+            for statistic in snapshot.statistics('lineno')[:PROFILE_TOP]:
+                summary.write(f'{statistic}\n')
+        with open(os.path.join(self.directory, f'{profile_id}.txt'), 'w') as f:
+            f.write(summary.getvalue())
+        return profile_id
+
+    # Text summary of a saved profile, or None when unknown
+    def summary(self, profile_id):
+        path = os.path.join(self.directory, f'{profile_id}.txt')
+        if not _PROFILE_ID.match(profile_id) or not os.path.isfile(path):
+            return None
+        with open(path) as f:
+            return f.read()
+
+# Time every request of app into REQUEST_DURATION by method, route template
+# and status, and serve all histograms as Prometheus text on /metrics.
+# With PROFILING set, requests can also be profiled (see Profiler) and the
+# summaries read back from /metrics/profiles/<id>; otherwise the profiler
+# is not even consulted. Streamed response bodies are not included in the
+# request time.
+def init_metrics(app):
+    app.config.setdefault('PROFILING', False)
+    app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILE_DIR', 'profiles')
+    profiler = Profiler(app.config['PROFILE_DIR'], app.config['PROFILE_SAMPLE_RATE']) \
+        if app.config['PROFILING'] else None
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        if profiler is not None:
+            profiler.start()
+
+    @app.after_request
+    def record(response):
+        if profiler is not None:
+            profile_id = profiler.stop()
+            if profile_id is not None:
+                response.headers[PROFILE_HEADER] = profile_id
+        _observe(response.status_code)
+        return response
+
+    # Failed requests skip after_request; count them as 500s
+    @app.teardown_request
+    def record_failure(error):
+        if error is not None and 'request_start' in g:
+            if profiler is not None:
+                profiler.stop(save=False)
+            _observe(500)
+
+    def metrics():
+        lines = []
+        for histogram in HISTOGRAMS:
+            lines.extend(histogram.render())
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    def profile_summary(profile_id):
+        summary = profiler.summary(profile_id) if profiler is not None else None
+        if summary is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        return Response(summary, mimetype='text/plain')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    app.add_url_rule('/metrics/profiles/<profile_id>', 'profile_summary', profile_summary)
+    return app
+
+def _observe(status):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_DURATION.observe(time.perf_counter() - start, request.method, route, str(status))
@@ -0,0 +1,244 @@
+import math
+import numpy as np
+from marks_stats import RANGE_LABELS, band_counts
+
+class RunningMoments:
+    """Count, mean, variance, min and max of a stream of marks.
+
+    Batches are folded in with the parallel form of Welford's algorithm
+    (Chan et al.), so an update costs O(batch) and two instances can be merged.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, marks):
+        marks = np.asarray(marks)
+        if len(marks) == 0:
+            return
+        batch = RunningMoments()
+        batch.count = len(marks)
+        batch.mean = float(marks.mean())
+        batch.m2 = float(((marks - batch.mean) ** 2).sum())
+        batch.min = marks.min().item()
+        batch.max = marks.max().item()
+        self.merge(batch)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    # Sample variance, as statistics.variance
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+class QuantileSketch:
+    """Mergeable quantile sketch.
+
+    With a relative_accuracy alpha, values are counted in logarithmic buckets
+    (DDSketch) and every quantile is within a factor (1 +/- alpha) of the true
+    order statistic, using memory independent of the number of values. With
+    relative_accuracy=None the sketch keeps every value, sorted, and answers
+    exactly like np.percentile. New values are sorted on their own and merged
+    into the sorted values on the next query, so a query after an update costs
+    O(N + batch log batch) rather than a sort of all N values.
+    """
+
+    # Values closer to zero than this share the zero bucket
+    MIN_INDEXABLE = 1e-9
+
+    def __init__(self, relative_accuracy=0.01):
+        if relative_accuracy is not None and not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1, or None for exact mode")
+        self.relative_accuracy = relative_accuracy
+        self.count = 0
+        self._view = None  # (values, cumulative counts) cached between updates
+        if self.exact:
+            self._sorted = np.zeros(0)
+            self._batches = []  # Values not yet merged into _sorted
+        else:
+            self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+            self._log_gamma = math.log(self._gamma)
+            self._positive = {}
+            self._negative = {}
+            self._zero = 0
+
+    @property
+    def exact(self):
+        return self.relative_accuracy is None
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self._view = None
+        if self.exact:
+            self._batches.append(values.copy())
+            return
+
+        magnitudes = np.abs(values)
+        indexable = magnitudes > self.MIN_INDEXABLE
+        self._zero += int((~indexable).sum())
+        keys = np.ceil(np.log(magnitudes[indexable]) / self._log_gamma).astype(np.int64)
+        signs = values[indexable] > 0
+        for store, selected in ((self._positive, keys[signs]), (self._negative, keys[~signs])):
+            for key, count in zip(*np.unique(selected, return_counts=True)):
+                store[key] = store.get(key, 0) + int(count)
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same relative_accuracy can be merged")
+        self.count += other.count
+        self._view = None
+        if self.exact:
+            self._batches.extend([other._sorted, *other._batches])
+            return
+        self._zero += other._zero
+        for store, other_store in ((self._positive, other._positive), (self._negative, other._negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+
+    # All values in ascending order (exact mode), with new batches merged in
+    def _sorted_values(self):
+        if self._batches:
+            batch = np.sort(np.concatenate(self._batches))
+            self._sorted = np.insert(self._sorted, np.searchsorted(self._sorted, batch, side='right'), batch)
+            self._batches = []
+        return self._sorted
+
+    # Ascending bucket values with cumulative counts (approximate mode)
+    def _values(self):
+        if self._view is None:
+            negative = sorted(self._negative.items(), reverse=True)
+            positive = sorted(self._positive.items())
+            keys = np.array([key for key, _ in negative + positive], dtype=float)
+            representatives = 2 * self._gamma ** keys / (self._gamma + 1)
+            representatives[:len(negative)] *= -1
+            values = np.concatenate([representatives[:len(negative)], [0.0], representatives[len(negative):]])
+            counts = np.array([c for _, c in negative] + [self._zero] + [c for _, c in positive], dtype=np.int64)
+            self._view = (values, np.cumsum(counts))
+        return self._view
+
+    # q-th percentile (0-100)
+    def quantile(self, q):
+        if self.count == 0:
+            raise ValueError("Empty sketch")
+
+        # Interpolate between neighbouring order statistics, as np.percentile
+        rank = q / 100 * (self.count - 1)
+        if self.exact:
+            lower, upper = self._sorted_values()[[math.floor(rank), math.ceil(rank)]]
+        else:
+            values, cumulative = self._values()
+            lower, upper = values[np.searchsorted(cumulative, [math.floor(rank), math.ceil(rank)], side='right')]
+        return float(lower + (upper - lower) * (rank - math.floor(rank)))
+
+    # Number of values strictly below `value` (approximate unless exact)
+    def count_below(self, value):
+        if self.exact:
+            return int(np.searchsorted(self._sorted_values(), value, side='left'))
+        values, cumulative = self._values()
+        position = np.searchsorted(values, value, side='left')
+        return int(cumulative[position - 1]) if position > 0 else 0
+
+    # Number of values strictly above `value` (approximate unless exact)
+    def count_above(self, value):
+        if self.exact:
+            return self.count - int(np.searchsorted(self._sorted_values(), value, side='right'))
+        values, cumulative = self._values()
+        position = np.searchsorted(values, value, side='right')
+        return self.count - (int(cumulative[position - 1]) if position > 0 else 0)
+
+class CourseAggregates:
+    """Incrementally maintained course_analysis figures for one course.
+
+    Exposes the same attributes as MarksStatistics; quartiles come from a
+    QuantileSketch and are recomputed at most once per update. As in the
+    app, quartiles are exact unless a relative_accuracy is given.
+    """
+
+    def __init__(self, relative_accuracy=None):
+        self.moments = RunningMoments()
+        self.sketch = QuantileSketch(relative_accuracy)
+        self.bands = np.zeros(len(RANGE_LABELS), dtype=np.int64)
+        self._quartiles = None
+
+    def update(self, marks):
+        marks = np.asarray(marks)
+        self.moments.update(marks)
+        self.sketch.update(marks)
+        self.bands += band_counts(np.sort(marks))
+        self._quartiles = None
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.bands += other.bands
+        self._quartiles = None
+
+    @property
+    def total(self):
+        return self.moments.count
+
+    @property
+    def mean(self):
+        return self.moments.mean
+
+    @property
+    def min(self):
+        return self.moments.min
+
+    @property
+    def max(self):
+        return self.moments.max
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.moments.variance)
+
+    @property
+    def quartiles(self):
+        if self._quartiles is None:
+            self._quartiles = tuple(self.sketch.quantile(q) for q in (25, 50, 75))
+        return self._quartiles
+
+    @property
+    def q1(self):
+        return self.quartiles[0]
+
+    @property
+    def q2(self):
+        return self.quartiles[1]
+
+    @property
+    def q3(self):
+        return self.quartiles[2]
+
+    @property
+    def median(self):
+        return self.q2
+
+    @property
+    def above_average(self):
+        return self.sketch.count_above(self.mean)
+
+    @property
+    def below_average(self):
+        return self.sketch.count_below(self.mean)
+
+    @property
+    def range_distribution(self):
+        return dict(zip(RANGE_LABELS, self.bands.tolist()))
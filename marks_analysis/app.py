@@ -1,9 +1,21 @@
-from flask import Flask, jsonify, request, send_from_directory, render_template
-import statistics
-import numpy as np
+from flask import Blueprint, Flask, Response, current_app, jsonify, request, send_from_directory, render_template
+import csv
+import io
+import json
 import os
+import numpy as np
+import sys
+
+# Modules shared by every app live in common/ next to the app directories
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-app = Flask(__name__)
+from common.ingest import DEFAULT_CACHE_BYTES, FrameCache
+from marks_stats import QUANTILE_CATEGORIES
+from marks_store import MarksStore, read_marks_upload
+from common.metrics import init_metrics, stage
+
+# Routes of the service; create_app registers them on each new app
+bp = Blueprint('marks_analysis', __name__)
 
 # Example data format
 data = {
@@ -13,105 +25,92 @@ data = {
     "person_id": "student_3"  # Unique identifier of the person
 }
 
+# Relative error bound of the quartiles reported by /course_analysis. None,
+# the default, keeps every mark and reports exact quartiles, agreeing with
+# /person_performance; a bound such as 0.01 opts in to a DDSketch whose
+# memory does not grow with the number of marks
+QUANTILE_ACCURACY = None
+
+# Look up the course named in the request, defaulting to the example course
+def requested_course():
+    store = current_app.extensions['marks_store']
+    course = request.args.get('course', data['course'])
+    if course not in store:
+        return None, (jsonify({'error': f"Unknown course '{course}'"}), 404)
+    return store.get(course), None
+
 # Helper function to compute percentile
 def calculate_percentile(rank, total_students):
     return (rank / total_students) * 100
 
 # Serve the index.html file from the templates folder
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
 # Course analysis API
-@app.route('/course_analysis', methods=['GET'])
+@bp.route('/course_analysis', methods=['GET'])
 def course_analysis():
-    marks = data['marks']
-    
-    # Statistical analysis
-    average_marks = statistics.mean(marks)
-    median_marks = statistics.median(marks)
-    min_marks = min(marks)
-    max_marks = max(marks)
-    stddev_marks = statistics.stdev(marks)
-    total_students = len(marks)
-    
-    # Quantile distribution
-    quantiles = np.percentile(marks, [25, 50, 75])
-    q1, q2, q3 = quantiles[0], quantiles[1], quantiles[2]
-    
-    # Proportion of students above and below average
-    above_avg = len([m for m in marks if m > average_marks])
-    below_avg = len([m for m in marks if m < average_marks])
-    
-    # Range distribution with finer intervals
-    range_distribution = {
-        "90-100": len([m for m in marks if 90 <= m <= 100]),
-        "80-89": len([m for m in marks if 80 <= m <= 89]),
-        "70-79": len([m for m in marks if 70 <= m <= 79]),
-        "60-69": len([m for m in marks if 60 <= m <= 69]),
-        "50-59": len([m for m in marks if 50 <= m <= 59]),
-        "below 50": len([m for m in marks if m < 50])
-    }
+    course, error = requested_course()
+    if error:
+        return error
+
+    # Incrementally maintained aggregates: O(1) per poll while marks are appended
+    stats = course.aggregates
     
     # Response
     course_analysis_result = {
-        "course_name": data['course'],
-        "total_students": total_students,
-        "average_marks": average_marks,
-        "median_marks": median_marks,
-        "min_marks": min_marks,
-        "max_marks": max_marks,
-        "stddev_marks": stddev_marks,
+        "course_name": course.name,
+        "total_students": stats.total,
+        "average_marks": stats.mean,
+        "median_marks": stats.median,
+        "min_marks": stats.min,
+        "max_marks": stats.max,
+        "stddev_marks": stats.stddev,
         "quantiles": {
-            "25th_percentile": q1,
-            "50th_percentile": q2,
-            "75th_percentile": q3
+            "25th_percentile": stats.q1,
+            "50th_percentile": stats.q2,
+            "75th_percentile": stats.q3
         },
-        "students_above_average": above_avg,
-        "students_below_average": below_avg,
-        "range_distribution": range_distribution
+        "students_above_average": stats.above_average,
+        "students_below_average": stats.below_average,
+        "range_distribution": stats.range_distribution
     }
     
     return jsonify(course_analysis_result)
 
 # Person's performance API based on marks and person ID
-@app.route('/person_performance', methods=['GET'])
+@bp.route('/person_performance', methods=['GET'])
 def person_performance():
-    person_marks = data['person_marks']  # The specific person's marks
-    marks = data['marks']
-    total_students = len(marks)
+    course, error = requested_course()
+    if error:
+        return error
+
+    person_id = request.args.get('person_id', data['person_id'])
+    if person_id not in course.index:
+        return jsonify({'error': f"Unknown student '{person_id}' in course '{course.name}'"}), 404
+    person_marks = course.marks_of(person_id)  # The specific person's marks
+    with stage('statistics'):  # Sorted marks, rebuilt on first use after an append
+        stats = course.statistics
     
-    # Sorting marks to determine rank
-    sorted_marks = sorted(marks, reverse=True)
-    person_rank = sorted_marks.index(person_marks) + 1  # 1-based index for ranking
+    # Rank by binary search in the sorted marks (1-based, ties share a rank)
+    person_rank = stats.rank(person_marks)
     
     # Percentile calculation
-    person_percentile = calculate_percentile(person_rank, total_students)
+    person_percentile = calculate_percentile(person_rank, stats.total)
     
     # Deviation from average
-    average_marks = statistics.mean(marks)
-    deviation_from_average = person_marks - average_marks
-    
-    # Quartiles for person comparison
-    quantiles = np.percentile(marks, [25, 50, 75])
-    q1, q2, q3 = quantiles[0], quantiles[1], quantiles[2]
+    deviation_from_average = person_marks - stats.mean
     
     # Check which quantile the person's marks fall into
-    if person_marks <= q1:
-        quantile_category = "Lower Quartile (0-25%)"
-    elif q1 < person_marks <= q2:
-        quantile_category = "Second Quartile (25-50%)"
-    elif q2 < person_marks <= q3:
-        quantile_category = "Third Quartile (50-75%)"
-    else:
-        quantile_category = "Top Quartile (75-100%)"
+    quantile_category = stats.quantile_category(person_marks)
     
     # Response
     person_performance_result = {
-        "person_id": data['person_id'],
+        "person_id": person_id,
         "person_marks": person_marks,
         "rank": person_rank,
-        "total_students": total_students,
+        "total_students": stats.total,
         "percentile": person_percentile,
         "deviation_from_average": deviation_from_average,
         "quantile_category": quantile_category
@@ -119,10 +118,161 @@ def person_performance():
     
     return jsonify(person_performance_result)
 
+# Bulk upload of marks as CSV or Parquet with course, student_id and marks columns
+@bp.route('/upload_marks', methods=['POST'])
+def upload_marks():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file uploaded'}), 400
+
+    store = current_app.extensions['marks_store']
+    try:
+        with stage('read_upload'):
+            df = read_marks_upload(request.files['file'], current_app.extensions['upload_cache'])
+        with stage('load_marks'):
+            courses_loaded, rows_loaded = store.load_frame(df)
+    except (ValueError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'courses': courses_loaded, 'rows': rows_loaded, 'total_courses': len(store)})
+
+# Append marks of newly graded students, either as JSON
+# {"course": ..., "student_ids": [...], "marks": [...]} or as a CSV/Parquet
+# file in the /upload_marks format. Aggregates are updated in O(batch).
+@bp.route('/append_marks', methods=['POST'])
+def append_marks():
+    store = current_app.extensions['marks_store']
+    try:
+        if 'file' in request.files:
+            with stage('read_upload'):
+                df = read_marks_upload(request.files['file'], current_app.extensions['upload_cache'])
+            with stage('append_marks'):
+                courses_appended, rows_appended = store.append_frame(df)
+            return jsonify({'courses': courses_appended, 'rows': rows_appended})
+
+        body = request.get_json(silent=True)
+        if (not isinstance(body, dict) or not body.get('course') or not isinstance(body['course'], str)
+                or not body.get('student_ids') or not isinstance(body['student_ids'], list)
+                or not isinstance(body.get('marks', []), list)):
+            return jsonify({'error': "Expected a file or JSON with 'course', 'student_ids' and 'marks'"}), 400
+        with stage('append_marks'):
+            store.append(body['course'], body['student_ids'], np.asarray(body.get('marks', []), dtype=float))
+    except (ValueError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'courses': 1, 'rows': len(body['student_ids']),
+                    'total_students': len(store.get(body['course']))})
+
+# Fields of each cohort performance record, in output order
+PERFORMANCE_FIELDS = ["person_id", "person_marks", "rank", "total_students", "percentile",
+                      "deviation_from_average", "quantile_category"]
+
+# Rows per chunk of a streamed cohort response
+COHORT_CHUNK_ROWS = 10000
+
+# Yield cohort performance records as JSON lines or CSV, COHORT_CHUNK_ROWS at a time
+def stream_performance(columns, output_format):
+    rows = zip(*columns)
+    if output_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(PERFORMANCE_FIELDS)
+        for i, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if i % COHORT_CHUNK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        lines = []
+        for row in rows:
+            lines.append(json.dumps(dict(zip(PERFORMANCE_FIELDS, row))))
+            if len(lines) == COHORT_CHUNK_ROWS:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+# Performance of every student in a course, or of the IDs given as a
+# comma-separated `ids` argument (or a JSON {"ids": [...]} body), in one pass.
+# Ranks, percentiles and quartiles match /person_performance.
+@bp.route('/cohort_performance', methods=['GET', 'POST'])
+def cohort_performance():
+    course, error = requested_course()
+    if error:
+        return error
+    with stage('statistics'):
+        stats = course.statistics
+
+    output_format = request.args.get('format', 'jsonl')
+    if output_format not in ('jsonl', 'csv'):
+        return jsonify({'error': "format must be 'jsonl' or 'csv'"}), 400
+
+    # Select the requested students, or the whole cohort
+    body = request.get_json(silent=True) or {}
+    ids = body.get('ids') or [i for i in request.args.get('ids', '').split(',') if i]
+    if ids:
+        unknown = [i for i in ids if i not in course.index]
+        if unknown:
+            return jsonify({'error': f"Unknown student(s) in course '{course.name}'", 'unknown_ids': unknown[:100]}), 404
+        rows = np.fromiter((course.index[i] for i in ids), dtype=np.int64, count=len(ids))
+        person_ids, person_marks = course.student_ids[rows], course.marks[rows]
+    else:
+        person_ids, person_marks = course.student_ids, course.marks
+
+    # Vectorized rank, percentile, deviation and quartile for all selected students
+    with stage('cohort_ranks'):
+        ranks = stats.ranks(person_marks)
+        percentiles = calculate_percentile(ranks, stats.total)
+        deviations = person_marks - stats.mean
+        categories = np.array(QUANTILE_CATEGORIES)[stats.quantile_index(person_marks)]
+
+    columns = [person_ids.tolist(), person_marks.tolist(), ranks.tolist(), [stats.total] * len(ranks),
+               percentiles.tolist(), deviations.tolist(), categories.tolist()]
+    mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+    return Response(stream_performance(columns, output_format), mimetype=mimetype)
+
 # Serve static files (if any)
-@app.route('/<path:path>')
+@bp.route('/<path:path>')
 def static_file(path):
     return send_from_directory('', path)
 
+# Build the app. Settings are the defaults below, overridden by FLASK_*
+# environment variables (FLASK_WARM_UP=1, FLASK_QUANTILE_ACCURACY=0.01,
+# FLASK_PROFILING=1, ...) and then by config. Each app has its own marks
+# store, seeded with the example course (student_1 ... student_12), and a
+# cache of parsed uploads of at most UPLOAD_CACHE_BYTES. Request and stage
+# latencies are served on /metrics. Serve with e.g.
+# gunicorn --preload 'app:create_app()'.
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.from_mapping(WARM_UP=False, QUANTILE_ACCURACY=QUANTILE_ACCURACY, UPLOAD_CACHE_BYTES=DEFAULT_CACHE_BYTES)
+    app.config.from_prefixed_env()
+    app.config.from_mapping(config or {})
+
+    store = MarksStore(relative_accuracy=app.config['QUANTILE_ACCURACY'])
+    store.put(data['course'], [f"student_{i + 1}" for i in range(len(data['marks']))], data['marks'])
+    app.extensions['marks_store'] = store
+    app.extensions['upload_cache'] = FrameCache(app.config['UPLOAD_CACHE_BYTES'])
+    app.register_blueprint(bp)
+    init_metrics(app)
+    if app.config['WARM_UP']:
+        warm_up()
+    return app
+
+# Load pandas, used by uploads only, and run a tiny course through the
+# statistics of every endpoint. Meant to run before workers fork
+# (gunicorn --preload) so they share the pages.
+def warm_up():
+    import pandas as pd
+
+    store = MarksStore(relative_accuracy=QUANTILE_ACCURACY)
+    store.load_frame(pd.DataFrame({'course': ['warm-up'] * 3, 'student_id': ['a', 'b', 'c'],
+                                   'marks': [1.0, 2.0, 3.0]}))
+    course = store.get('warm-up')
+    course.statistics.ranks(course.marks)
+    course.statistics.quantile_index(course.marks)
+    course.aggregates.range_distribution
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
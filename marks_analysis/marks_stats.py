@@ -0,0 +1,87 @@
+import numpy as np
+
+# Bands reported in range_distribution as (label, lowest, highest), both inclusive
+RANGE_BANDS = [
+    ("90-100", 90, 100),
+    ("80-89", 80, 89),
+    ("70-79", 70, 79),
+    ("60-69", 60, 69),
+    ("50-59", 50, 59),
+]
+BELOW_RANGE_LABEL = "below 50"
+BELOW_RANGE_LIMIT = 50
+
+RANGE_LABELS = [label for label, _, _ in RANGE_BANDS] + [BELOW_RANGE_LABEL]
+
+QUANTILE_CATEGORIES = [
+    "Lower Quartile (0-25%)",
+    "Second Quartile (25-50%)",
+    "Third Quartile (50-75%)",
+    "Top Quartile (75-100%)",
+]
+
+# Counts per RANGE_LABELS entry for sorted marks, from vectorized binary searches
+def band_counts(sorted_marks):
+    lows = np.array([low for _, low, _ in RANGE_BANDS] + [-np.inf])
+    highs = np.array([high for _, _, high in RANGE_BANDS] + [BELOW_RANGE_LIMIT])
+    upper = np.searchsorted(sorted_marks, highs, side='right')
+    upper[-1] = np.searchsorted(sorted_marks, BELOW_RANGE_LIMIT, side='left')  # "below 50" is strict
+    return upper - np.searchsorted(sorted_marks, lows, side='left')
+
+class MarksStatistics:
+    """Summary statistics of one set of marks, computed once.
+
+    Marks are kept as a sorted array with prefix sums, so rank, percentile and
+    range counts are binary searches rather than passes over the data.
+    """
+
+    def __init__(self, marks):
+        self.sorted_marks = np.sort(np.asarray(marks))
+        self.prefix_sums = np.concatenate([[0], np.cumsum(self.sorted_marks, dtype=float)])
+        self.total = len(self.sorted_marks)
+        if self.total == 0:
+            raise ValueError("No marks to analyse")
+
+        self.mean = self.prefix_sums[-1] / self.total
+        self.min = self.sorted_marks[0].item()
+        self.max = self.sorted_marks[-1].item()
+        self.stddev = float(np.std(self.sorted_marks, ddof=1)) if self.total > 1 else 0.0
+        self.q1, self.q2, self.q3 = (self._percentile(q) for q in (25, 50, 75))
+        self.median = self.q2
+
+        # Students strictly above and below the average
+        self.above_average = self.total - self.count_at_most(self.mean)
+        self.below_average = self.count_below(self.mean)
+
+        self.range_distribution = dict(zip(RANGE_LABELS, band_counts(self.sorted_marks).tolist()))
+
+    # Linear-interpolated percentile of the sorted marks, as np.percentile
+    def _percentile(self, q):
+        position = q / 100 * (self.total - 1)
+        lower = int(np.floor(position))
+        upper = min(lower + 1, self.total - 1)
+        fraction = position - lower
+        return float(self.sorted_marks[lower] + (self.sorted_marks[upper] - self.sorted_marks[lower]) * fraction)
+
+    # Number of marks strictly below `mark`
+    def count_below(self, mark):
+        return int(np.searchsorted(self.sorted_marks, mark, side='left'))
+
+    # Number of marks at or below `mark`
+    def count_at_most(self, mark):
+        return int(np.searchsorted(self.sorted_marks, mark, side='right'))
+
+    # 1-based rank among all marks in descending order; ties share the best rank
+    def rank(self, mark):
+        return self.total - self.count_at_most(mark) + 1
+
+    # Vectorized rank for an array of marks
+    def ranks(self, marks):
+        return self.total - np.searchsorted(self.sorted_marks, marks, side='right') + 1
+
+    # Index into QUANTILE_CATEGORIES for the given mark(s)
+    def quantile_index(self, marks):
+        return np.searchsorted([self.q1, self.q2, self.q3], marks, side='left')
+
+    def quantile_category(self, mark):
+        return QUANTILE_CATEGORIES[int(self.quantile_index(mark))]
@@ -0,0 +1,199 @@
+import threading
+import numpy as np
+from aggregates import CourseAggregates
+from common.ingest import compact_marks, read_frame
+from marks_stats import MarksStatistics
+
+# Columns expected in a bulk marks upload
+UPLOAD_COLUMNS = ['course', 'student_id', 'marks']
+
+# Row numbers listed in the error for rows without a course or a mark
+MAX_REPORTED_ROWS = 10
+
+class CourseMarks:
+    """Marks of one course as columnar arrays.
+
+    Rows live in buffers that grow geometrically, so appending a batch costs
+    O(batch) amortized. CourseAggregates is kept up to date on every append;
+    the student ID -> row index map and the sorted MarksStatistics are built
+    on first use and the statistics are dropped whenever marks are appended.
+    """
+
+    def __init__(self, name, student_ids, marks, relative_accuracy=None):
+        self.name = name
+        self.aggregates = CourseAggregates(relative_accuracy)
+        self._size = 0
+        self._student_ids = np.empty(0, dtype=object)
+        self._marks = np.empty(0, dtype=np.asarray(marks).dtype)
+        self._index = None
+        self._statistics = None
+        self._lock = threading.Lock()
+        self.append(student_ids, marks)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def student_ids(self):
+        return self._student_ids[:self._size]
+
+    @property
+    def marks(self):
+        return self._marks[:self._size]
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = {student_id: i for i, student_id in enumerate(self.student_ids)}
+        return self._index
+
+    @property
+    def statistics(self):
+        if self._statistics is None:
+            self._statistics = MarksStatistics(self.marks)
+        return self._statistics
+
+    # Marks of one student; raises KeyError for unknown IDs
+    def marks_of(self, student_id):
+        return self.marks[self.index[student_id]].item()
+
+    # Raise ValueError unless append(student_ids, marks) would succeed
+    def check_append(self, student_ids, marks):
+        if len(student_ids) != len(marks):
+            raise ValueError("student_ids and marks must have the same length")
+        if not np.isfinite(marks).all():
+            raise ValueError(f"Marks for course '{self.name}' must be finite numbers")
+        if len(set(student_ids.tolist())) != len(student_ids):
+            raise ValueError(f"Duplicate student IDs in batch for course '{self.name}'")
+        if self._size and any(student_id in self.index for student_id in student_ids.tolist()):
+            raise ValueError(f"Marks for some students in course '{self.name}' already exist")
+
+    # Add marks for students not yet in the course
+    def append(self, student_ids, marks):
+        student_ids = np.asarray(student_ids, dtype=object)
+        marks = np.asarray(marks)
+
+        with self._lock:
+            self.check_append(student_ids, marks)
+
+            end = self._size + len(marks)
+            if end > len(self._marks) or np.result_type(self._marks, marks) != self._marks.dtype:
+                capacity = max(end, 2 * len(self._marks))
+                dtype = np.result_type(self._marks, marks)
+                self._student_ids = np.concatenate([self.student_ids, np.empty(capacity - self._size, dtype=object)])
+                self._marks = np.concatenate([self.marks.astype(dtype), np.empty(capacity - self._size, dtype=dtype)])
+            self._student_ids[self._size:end] = student_ids
+            self._marks[self._size:end] = marks
+
+            if self._index is not None:
+                self._index.update(zip(student_ids.tolist(), range(self._size, end)))
+            self._size = end
+            self.aggregates.update(marks)
+            self._statistics = None
+
+class MarksStore:
+    """In-process store of many courses, keyed by course name.
+
+    relative_accuracy is passed to each course's quantile sketch; None, the
+    default, keeps exact quartiles.
+    """
+
+    def __init__(self, relative_accuracy=None):
+        self.relative_accuracy = relative_accuracy
+        self.courses = {}
+
+    def __contains__(self, course):
+        return course in self.courses
+
+    def __len__(self):
+        return len(self.courses)
+
+    # Course by name; raises KeyError for unknown courses
+    def get(self, course):
+        return self.courses[course]
+
+    # Replace the marks of one course
+    def put(self, course, student_ids, marks):
+        self.courses[course] = CourseMarks(course, student_ids, marks, self.relative_accuracy)
+
+    # Add marks for new students of a course, creating the course if needed
+    def append(self, course, student_ids, marks):
+        if course in self.courses:
+            self.courses[course].append(student_ids, marks)
+        else:
+            self.put(course, student_ids, marks)
+
+    # Load a long-format frame with UPLOAD_COLUMNS. Every course present in the
+    # frame is replaced; for repeated (course, student_id) rows the last wins.
+    # Returns the number of courses and rows loaded.
+    def load_frame(self, df):
+        df = _check_columns(df).drop_duplicates(['course', 'student_id'], keep='last')
+        groups = _group_by_course(df)
+        for name, ids, course_marks in groups:
+            self.put(name, ids, course_marks)
+        return len(groups), len(df)
+
+    # Append a long-format frame with UPLOAD_COLUMNS course by course. Every
+    # course is checked before any is changed, so a rejected frame appends
+    # nothing. Returns the number of courses and rows appended.
+    def append_frame(self, df):
+        df = _check_columns(df)
+        groups = _group_by_course(df)
+        for name, ids, course_marks in groups:
+            if name in self.courses:
+                self.courses[name].check_append(ids, course_marks)
+            elif len(set(ids.tolist())) != len(ids):
+                raise ValueError(f"Duplicate student IDs in batch for course '{name}'")
+        for name, ids, course_marks in groups:
+            self.append(name, ids, course_marks)
+        return len(groups), len(df)
+
+def _check_columns(df):
+    missing = [column for column in UPLOAD_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Upload is missing column(s): {', '.join(missing)}")
+    return df[UPLOAD_COLUMNS]
+
+# Split a frame into (course, student_ids, marks) with one stable sort of
+# factorized course codes instead of a Python-level groupby. Rows without a
+# course are rejected: they would otherwise form a group of their own. So
+# are blank or infinite marks, which would turn every statistic into NaN.
+def _group_by_course(df):
+    import pandas as pd
+
+    codes, names = pd.factorize(df['course'], sort=False)
+    if (codes == -1).any():
+        raise ValueError(f"Missing course in {_listed_rows(df.index[codes == -1])}")
+    marks = pd.to_numeric(df['marks']).to_numpy()
+    if not np.isfinite(marks).all():
+        raise ValueError(f"Missing or invalid marks in {_listed_rows(df.index[~np.isfinite(marks)])}")
+    order = np.argsort(codes, kind='stable')
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    student_ids = df['student_id'].to_numpy(dtype=object)[order]
+    marks = marks[order]
+    return list(zip(names, np.split(student_ids, bounds), np.split(marks, bounds)))
+
+# "<n> row(s) of the upload: <1-based row numbers>", listing at most
+# MAX_REPORTED_ROWS of them
+def _listed_rows(index):
+    rows = [str(row + 1) for row in index]
+    listed = ', '.join(rows[:MAX_REPORTED_ROWS]) + (', ...' if len(rows) > MAX_REPORTED_ROWS else '')
+    return f"{len(rows)} row(s) of the upload: {listed}"
+
+# Read an uploaded CSV, Parquet or Arrow file of marks into a DataFrame.
+# Files seen before are not parsed again: cache keeps the parsed frame with
+# courses as categories and marks as compact as they are exact, and only
+# the marks are widened again for this request.
+def read_marks_upload(file, cache):
+    df = cache.load(file, 'marks', parse_marks_upload)
+    if df['marks'].dtype == np.float32:
+        df = df.assign(marks=df['marks'].astype(np.float64))
+    return df
+
+def parse_marks_upload(upload):
+    import pandas as pd  # Imported on first upload: only bulk loads need pandas
+
+    df = read_frame(upload.source, upload.format, columns=UPLOAD_COLUMNS,
+                    dtype={'course': 'category', 'student_id': str})
+    df = _check_columns(df)
+    return df.assign(marks=compact_marks(pd.to_numeric(df['marks']).to_numpy()))
@@ -0,0 +1,104 @@
+import numpy as np
+from functools import lru_cache
+import grading
+from common.metrics import stage
+
+# SA ranges searched for a recommendation, as [start, stop)
+SA_RANGES = [[60, 71], [70, 81], [80, 91], [90, 101]]
+
+# Distinct grade distributions whose normality result is kept in memory
+NORMALITY_CACHE_SIZE = 4096
+
+# Function to calculate grade ranges
+def calculate_grade_ranges(SA, Span, median):
+    AA_range = f"Greater than {SA} upto 100"
+    AB_start = SA - Span + 1
+    AB_range = f"{AB_start} to {SA}"
+    BB_start = SA - 2 * Span + 1
+    BB_end = SA - Span
+    BB_range = f"{BB_start} to {BB_end}"
+    BC_start = SA - 3 * Span + 1
+    BC_end = SA - 2 * Span
+    BC_range = f"{BC_start} to {BC_end}"
+    CC_start = SA - 4 * Span + 1
+    CC_end = SA - 3 * Span
+    CC_range = f"{CC_start} to {CC_end}"
+    CD_start = SA - 5 * Span + 1
+    CD_end = SA - 4 * Span
+    CD_range = f"{CD_start} to {CD_end}"
+    median = np.ceil(median)
+    DD_start = median / 2 if median % 2 == 0 else (median + 1) / 2
+    DD_range = f"{int(DD_start)} to {CD_start - 1}"
+    FF_range = f"Less than {int(DD_start)}"
+
+    return {
+        'AA': AA_range, 'AB': AB_range, 'BB': BB_range, 'BC': BC_range,
+        'CC': CC_range, 'CD': CD_range, 'DD': DD_range, 'FF': FF_range
+    }
+
+# Function to categorize marks
+def categorize_marks(mark, SA, Span, median):
+    if mark > SA:
+        return "AA"
+    elif SA - Span + 1 <= mark <= SA:
+        return "AB"
+    elif SA - 2 * Span + 1 <= mark <= SA - Span:
+        return "BB"
+    elif SA - 3 * Span + 1 <= mark <= SA - 2 * Span:
+        return "BC"
+    elif SA - 4 * Span + 1 <= mark <= SA - 3 * Span:
+        return "CC"
+    elif SA - 5 * Span + 1 <= mark <= SA - 4 * Span:
+        return "CD"
+    elif mark >= (median / 2 if median % 2 == 0 else (median + 1) / 2):
+        return "DD"
+    else:
+        return "FF"
+
+# Function to calculate normality using Shapiro-Wilk test.
+# Results are memoized by the count of every grade (in grading.GRADES order),
+# so distributions already seen by any request are not tested again.
+def calculate_normality(grade_counts):
+    return _normality_of_counts(tuple(int(grade_counts.get(grade, 0)) for grade in grading.GRADES))
+
+@lru_cache(maxsize=NORMALITY_CACHE_SIZE)
+def _normality_of_counts(counts):
+    from scipy import stats  # Imported on first use: scipy.stats is slow to load
+
+    grade_values = {'FF': 1, 'DD': 2, 'CD': 3, 'CC': 4, 'BC': 5, 'BB': 6, 'AB': 7, 'AA': 8}
+    numerical_data = []
+    for grade, count in zip(grading.GRADES, counts):
+        numerical_data.extend([grade_values[grade]] * count)
+
+    if len(set(numerical_data)) == 1:
+        return 0
+
+    _, p_value = stats.shapiro(numerical_data)
+    return p_value
+
+# Analyze distributions. progress, if given, is called after every SA value
+# with the sweep position and best result so far; it may raise to stop.
+def analyze_distributions(df, st, en, span, progress=None):
+    marks = df['Marks'].to_numpy(dtype=float)
+    median = df['Marks'].median()
+    best_sa = None
+    best_p_value = 0
+    best_grade_counts = None
+
+    for sa in range(st, en):
+        with stage('grading'):
+            codes = grading.grade_codes(marks, sa, span, median)
+            grade_counts = grading.counts_series(grading.grade_counts(codes))
+
+        with stage('normality'):
+            p_value = calculate_normality(grade_counts)
+
+        if p_value > best_p_value:
+            best_p_value = p_value
+            best_sa = sa
+            best_grade_counts = grade_counts
+
+        if progress is not None:
+            progress(sa=sa, start=st, stop=en, best_sa=best_sa, best_p_value=float(best_p_value))
+
+    return best_sa, best_p_value, best_grade_counts
@@ -1,138 +1,235 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, render_template
 import pandas as pd
 import numpy as np
+import json
 import os
-import matplotlib.pyplot as plt
-from scipy import stats
-
-app = Flask(__name__, static_folder='static')
-
-# Function to calculate grade ranges
-def calculate_grade_ranges(SA, Span, median):
-    AA_range = f"Greater than {SA} upto 100"
-    AB_start = SA - Span + 1
-    AB_range = f"{AB_start} to {SA}"
-    BB_start = SA - 2 * Span + 1
-    BB_end = SA - Span
-    BB_range = f"{BB_start} to {BB_end}"
-    BC_start = SA - 3 * Span + 1
-    BC_end = SA - 2 * Span
-    BC_range = f"{BC_start} to {BC_end}"
-    CC_start = SA - 4 * Span + 1
-    CC_end = SA - 3 * Span
-    CC_range = f"{CC_start} to {CC_end}"
-    CD_start = SA - 5 * Span + 1
-    CD_end = SA - 4 * Span
-    CD_range = f"{CD_start} to {CD_end}"
-    median = np.ceil(median)
-    DD_start = median / 2 if median % 2 == 0 else (median + 1) / 2
-    DD_range = f"{int(DD_start)} to {CD_start - 1}"
-    FF_range = f"Less than {int(DD_start)}"
-
-    return {
-        'AA': AA_range, 'AB': AB_range, 'BB': BB_range, 'BC': BC_range,
-        'CC': CC_range, 'CD': CD_range, 'DD': DD_range, 'FF': FF_range
-    }
-
-# Function to categorize marks
-def categorize_marks(mark, SA, Span, median):
-    if mark > SA:
-        return "AA"
-    elif SA - Span + 1 <= mark <= SA:
-        return "AB"
-    elif SA - 2 * Span + 1 <= mark <= SA - Span:
-        return "BB"
-    elif SA - 3 * Span + 1 <= mark <= SA - 2 * Span:
-        return "BC"
-    elif SA - 4 * Span + 1 <= mark <= SA - 3 * Span:
-        return "CC"
-    elif SA - 5 * Span + 1 <= mark <= SA - 4 * Span:
-        return "CD"
-    elif mark >= (median / 2 if median % 2 == 0 else (median + 1) / 2):
-        return "DD"
-    else:
-        return "FF"
-
-# Function to calculate normality using Shapiro-Wilk test
-def calculate_normality(grade_counts):
-    grade_values = {'FF': 1, 'DD': 2, 'CD': 3, 'CC': 4, 'BC': 5, 'BB': 6, 'AB': 7, 'AA': 8}
-    numerical_data = []
-    for grade, count in grade_counts.items():
-        numerical_data.extend([grade_values[grade]] * count)
-
-    if len(set(numerical_data)) == 1:
-        return 0
-
-    _, p_value = stats.shapiro(numerical_data)
-    return p_value
-
-# Analyze distributions
-def analyze_distributions(df, st, en, span):
-    median = df['Marks'].median()
-    best_sa = None
-    best_p_value = 0
-    best_grade_counts = None
-
-    for sa in range(st, en):
-        df['Grade'] = df['Marks'].apply(lambda x: categorize_marks(x, sa, span, median))
-        grade_counts = df['Grade'].value_counts().sort_index()
-
-        p_value = calculate_normality(grade_counts)
-
-        if p_value > best_p_value:
-            best_p_value = p_value
-            best_sa = sa
-            best_grade_counts = grade_counts
-
-    return best_sa, best_p_value, best_grade_counts
-
-# Save chart
-def save_chart(best_grade_counts, sa_value, subject_name):
-    plt.figure(figsize=(12, 6))
-    ax = best_grade_counts.plot(kind='bar', color='skyblue')
-    plt.title(f'Distribution of Grades (SA={sa_value}) for {subject_name}')
-    plt.xlabel('Grade')
-    plt.ylabel('Number of Students')
-    plt.tight_layout()
-
-    chart_path = os.path.join('static', f'grade_distribution_{sa_value}.png')
-    plt.savefig(chart_path)
-    plt.close()
-    return chart_path
+import sys
+
+# Modules shared by every app live in common/ next to the app directories
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import grading
+from analysis import SA_RANGES, calculate_grade_ranges, analyze_distributions, _normality_of_counts
+from charts import CHART_DIR, submit_chart
+from common.ingest import DEFAULT_CACHE_BYTES, FrameCache, compact_marks, read_frame
+from common.jobs import DEFAULT_JOB_TTL, DEFAULT_JOB_WORKERS, JobManager
+from common.metrics import init_metrics, stage
+from batch import read_subjects, run_batch
+from sweep import sweep, best_in_range
+
+# Routes of the service; create_app registers them on each new app
+bp = Blueprint('sa_value_optimization', __name__)
+
+# Directory large uploads are spooled to while they are parsed
+UPLOAD_DIR = 'uploads'
+
+# Largest (SA x Span) grid accepted by /api/sweep
+MAX_SWEEP_CANDIDATES = 20000
+
+# Default and largest total time budget of /api/analyze_batch, in seconds
+DEFAULT_BATCH_BUDGET = 60
+MAX_BATCH_BUDGET = 600
 
 # Route for homepage
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-# API route for analyzing grades
-@app.route('/api/analyze', methods=['POST'])
-def analyze():
-    sa_value = int(request.form['saValue'])
-    file = request.files['filePath']
-    file_path = os.path.join('uploads', file.filename)
-    file.save(file_path)
+# Marks column of an uploaded CSV, Parquet or Arrow file as float64. Files
+# seen before are not parsed again: cache keeps their marks as compact as
+# they are exact, and they are only widened again for this request.
+def read_marks(file, cache):
+    return cache.load(file, 'marks', parse_marks).astype(float)
 
-    df = pd.read_csv(file_path)
+def parse_marks(upload):
+    df = read_frame(upload.source, upload.format, columns=['Marks'])
+    if 'Marks' not in df.columns:
+        raise ValueError("File must contain a 'Marks' column.")
+    return compact_marks(pd.to_numeric(df['Marks']).to_numpy())
 
-    sa_ranges = [[60, 71], [70, 81], [80, 91], [90, 101]]
+# API route for analyzing grades
+@bp.route('/api/analyze', methods=['POST'])
+def analyze():
+    try:
+        with stage('read_upload'):
+            marks = read_marks(request.files['filePath'], current_app.extensions['upload_cache'])
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    df = pd.DataFrame({'Marks': marks})
+
+    # With async=1 the analysis runs as a background job and its id is returned at once
+    if request.form.get('async'):
+        job = current_app.extensions['jobs'].submit(analyze_marks, df)
+        return jsonify({'jobId': job.id, 'statusUrl': f'/jobs/{job.id}'}), 202
+
+    return jsonify(analyze_marks(df))
+
+# Best SA of every range with its grade ranges, counts and chart.
+# progress, if given, receives the range being searched and the SA sweep
+# position within it.
+def analyze_marks(df, progress=None):
     results = {}
 
-    for st, en in sa_ranges:
-        best_sa, best_p_value, best_grade_counts = analyze_distributions(df, st, en, 9)
+    for i, (st, en) in enumerate(SA_RANGES):
+        if progress is not None:
+            progress(range_index=i, ranges=len(SA_RANGES))
+        best_sa, best_p_value, best_grade_counts = analyze_distributions(df, st, en, 9, progress)
 
         results[best_sa] = {
             'gradeRanges': calculate_grade_ranges(best_sa, 9, df['Marks'].median()),
             'gradeCounts': best_grade_counts.to_dict()
         }
 
-        # Save the chart
-        chart_path = save_chart(best_grade_counts, best_sa, "Student Marks")
-        results[best_sa]['chartPath'] = f'/static/grade_distribution_{sa_value}.png'
+        # Render the chart in the background; the image appears at chartPath once drawn
+        chart_name = submit_chart(best_grade_counts, best_sa, "Student Marks")
+        results[best_sa]['chartPath'] = f'/static/{chart_name}'
+
+    return results
+
+# Status and progress of a background job
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = current_app.extensions['jobs'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+# Analysis results of a finished job, as returned by /api/analyze
+@bp.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = current_app.extensions['jobs'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.state != 'done':
+        return jsonify({'error': f'Job is {job.state}', 'job': job.to_dict()}), 409
+    return jsonify(job.result)
+
+# Cancel a queued or running job
+@bp.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = current_app.extensions['jobs'].cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 202
+
+# API route analyzing many subjects from one long-format upload
+# (subject, student, marks columns; CSV or Parquet). Subjects are analyzed in
+# parallel worker processes and streamed back as JSON lines as they finish.
+@bp.route('/api/analyze_batch', methods=['POST'])
+def analyze_batch():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file uploaded'}), 400
+
+    try:
+        with stage('read_upload'):
+            subjects = read_subjects(request.files['file'], current_app.extensions['upload_cache'])
+        time_budget = min(float(request.form.get('timeBudget', DEFAULT_BATCH_BUDGET)), MAX_BATCH_BUDGET)
+        span = int(request.form.get('span', 9))
+        if not time_budget > 0 or span <= 0:
+            raise ValueError('timeBudget and span must be positive')
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    lines = (json.dumps(result) + '\n' for result in run_batch(subjects, time_budget, span))
+    return Response(lines, mimetype='application/x-ndjson')
+
+# Hit and miss counters and size of the cache of parsed uploads
+@bp.route('/api/upload_cache', methods=['GET'])
+def upload_cache():
+    return jsonify(current_app.extensions['upload_cache'].info())
+
+# Hit and miss counters of the normality cache
+@bp.route('/api/normality_cache', methods=['GET'])
+def normality_cache():
+    info = _normality_of_counts.cache_info()
+    return jsonify({'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxSize': info.maxsize})
+
+# API route scoring a whole grid of SA and Span values in one pass
+@bp.route('/api/sweep', methods=['POST'])
+def sweep_grid():
+    try:
+        with stage('read_upload'):
+            marks = read_marks(request.files['filePath'], current_app.extensions['upload_cache'])
+
+        # SA values from saStart to saStop (inclusive) every saStep, for each Span in spans
+        sa_start = float(request.form.get('saStart', SA_RANGES[0][0]))
+        sa_stop = float(request.form.get('saStop', SA_RANGES[-1][1] - 1))
+        sa_step = float(request.form.get('saStep', 1))
+        spans = [float(span) for span in request.form.get('spans', '9').split(',')]
+        if not all(np.isfinite([sa_start, sa_stop, sa_step, *spans])):
+            raise ValueError('saStart, saStop, saStep and spans must be finite numbers')
+        if sa_step <= 0 or min(spans) <= 0:
+            raise ValueError('saStep and spans must be positive')
+        if sa_start > sa_stop:
+            raise ValueError('saStart must not be above saStop')
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    median = pd.Series(marks).median()
+
+    sa_values = np.arange(sa_start, sa_stop + sa_step / 2, sa_step)
+    if len(sa_values) * len(spans) > MAX_SWEEP_CANDIDATES:
+        return jsonify({'error': f'At most {MAX_SWEEP_CANDIDATES} SA and Span combinations per sweep'}), 400
+
+    try:
+        with stage('sweep'):
+            curves = sweep(marks, sa_values, spans, median)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results = {}
+    for span, (sa_curve, p_values, counts) in curves.items():
+        best_by_range = {}
+        for st, en in SA_RANGES:
+            best = best_in_range(sa_curve, p_values, st, en)
+            best_by_range[f'{st}-{en - 1}'] = None if best is None else {
+                'sa': float(sa_curve[best]),
+                'pValue': float(p_values[best]),
+                'gradeCounts': grading.counts_series(counts[best]).to_dict()
+            }
+        results[f'{span:g}'] = {
+            'saValues': sa_curve.tolist(),
+            'pValues': p_values.tolist(),
+            'bestByRange': best_by_range
+        }
 
-    return jsonify(results)
+    return jsonify({'median': median, 'spans': results})
+
+# Build the app. Settings are the defaults below, overridden by FLASK_*
+# environment variables (FLASK_WARM_UP=1, FLASK_JOB_WORKERS=4,
+# FLASK_PROFILING=1, ...) and then by config. Background analyses started
+# with async=1 run on the app's own JobManager, and parsed uploads are kept
+# in a cache of at most UPLOAD_CACHE_BYTES. Request and stage latencies are
+# served on /metrics. Serve with e.g. gunicorn --preload 'app:create_app()'.
+def create_app(config=None):
+    app = Flask(__name__, static_folder=CHART_DIR)
+    app.config.from_mapping(WARM_UP=False, JOB_WORKERS=DEFAULT_JOB_WORKERS, JOB_TTL=DEFAULT_JOB_TTL,
+                            UPLOAD_CACHE_BYTES=DEFAULT_CACHE_BYTES)
+    app.config.from_prefixed_env()
+    app.config.from_mapping(config or {})
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    os.makedirs(CHART_DIR, exist_ok=True)
+    app.extensions['jobs'] = JobManager(app.config['JOB_WORKERS'], app.config['JOB_TTL'])
+    app.extensions['upload_cache'] = FrameCache(app.config['UPLOAD_CACHE_BYTES'], UPLOAD_DIR)
+    app.register_blueprint(bp)
+    init_metrics(app)
+    if app.config['WARM_UP']:
+        warm_up()
+    return app
+
+# Import scipy and matplotlib, which are otherwise loaded by the first
+# analysis or chart, and run the grading, normality test and sweep once on
+# a tiny sample. Meant to run before workers fork (gunicorn --preload) so
+# they share the pages; the normality cache is left empty.
+def warm_up():
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    FigureCanvasAgg(Figure())
+    df = pd.DataFrame({'Marks': np.linspace(40, 100, 50)})
+    analyze_distributions(df, 80, 82, 9)
+    sweep(df['Marks'].to_numpy(), np.array([80.0, 81.0]), [9], df['Marks'].median())
+    _normality_of_counts.cache_clear()
 
 if __name__ == '__main__':
-    os.makedirs('uploads', exist_ok=True)
-    os.makedirs('static', exist_ok=True)
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,93 @@
+import multiprocessing
+import queue
+import time
+import numpy as np
+import pandas as pd
+from analysis import SA_RANGES, analyze_distributions, calculate_grade_ranges
+from common.ingest import compact_marks, read_frame
+
+# Columns of a long-format batch upload
+BATCH_COLUMNS = ['subject', 'student', 'marks']
+
+# Read a long-format CSV, Parquet or Arrow upload into per-subject mark
+# arrays. Returns a list of (subject, marks) in upload order. Files seen
+# before are not parsed again but taken from cache, which keeps the marks
+# as compact as they are exact; analyze_subject widens them again.
+def read_subjects(file, cache):
+    return cache.load(file, 'subjects', parse_subjects)
+
+def parse_subjects(upload):
+    df = read_frame(upload.source, upload.format, columns=BATCH_COLUMNS, dtype={'subject': 'category'})
+    missing = [column for column in BATCH_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Upload is missing column(s): {', '.join(missing)}")
+    marks = pd.to_numeric(df['marks'])  # Non-numeric marks raise ValueError, as in /api/analyze
+    return [(subject, compact_marks(group.to_numpy(dtype=float)))
+            for subject, group in marks.groupby(df['subject'], sort=False, observed=True)]
+
+# SA recommendation for every range of one subject, as /api/analyze without charts
+def analyze_subject(subject, marks, span=9):
+    start = time.perf_counter()
+    df = pd.DataFrame({'Marks': np.asarray(marks, dtype=float)})
+    median = df['Marks'].median()
+
+    ranges = {}
+    for st, en in SA_RANGES:
+        best_sa, best_p_value, best_grade_counts = analyze_distributions(df, st, en, span)
+        ranges[f'{st}-{en - 1}'] = None if best_sa is None else {
+            'sa': best_sa,
+            'pValue': float(best_p_value),
+            'gradeRanges': calculate_grade_ranges(best_sa, span, median),
+            'gradeCounts': best_grade_counts.to_dict()
+        }
+
+    return {'subject': subject, 'students': len(marks), 'results': ranges,
+            'seconds': time.perf_counter() - start}
+
+# Start method of the batch workers. A forked worker would inherit the locks
+# held by other threads of the server (the metrics histograms, the job
+# pool), so workers are started from a clean forkserver process, which has
+# this module preloaded, or spawned where forkserver is not available.
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    BATCH_CONTEXT = multiprocessing.get_context('forkserver')
+    BATCH_CONTEXT.set_forkserver_preload([__name__])
+else:
+    BATCH_CONTEXT = multiprocessing.get_context('spawn')
+
+# Analyze subjects across a process pool, yielding each subject's result as
+# soon as it finishes. Subjects not done within time_budget seconds are
+# reported as timed out and the workers still running are terminated, so no
+# work outlives the batch. The last item is a summary of the whole batch.
+def run_batch(subjects, time_budget, span=9, max_workers=None):
+    start = time.perf_counter()
+    completed = failed = 0
+    finished = queue.Queue()  # (index, result or None, exception or None)
+    pool = BATCH_CONTEXT.Pool(max_workers)
+    try:
+        for i, (subject, marks) in enumerate(subjects):
+            pool.apply_async(analyze_subject, (subject, marks, span),
+                             callback=lambda result, i=i: finished.put((i, result, None)),
+                             error_callback=lambda e, i=i: finished.put((i, None, e)))
+        pool.close()
+
+        pending = set(range(len(subjects)))
+        while pending:
+            try:
+                i, result, error = finished.get(timeout=max(start + time_budget - time.perf_counter(), 0))
+            except queue.Empty:
+                break
+            pending.discard(i)
+            if error is None:
+                yield result
+                completed += 1
+            else:
+                yield {'subject': subjects[i][0], 'error': str(error)}
+                failed += 1
+        for i in sorted(pending):
+            yield {'subject': subjects[i][0], 'error': 'Time budget exceeded'}
+    finally:
+        pool.terminate()
+        pool.join()
+
+    yield {'summary': {'subjects': len(subjects), 'completed': completed, 'failed': failed,
+                       'timedOut': len(subjects) - completed - failed, 'seconds': time.perf_counter() - start}}
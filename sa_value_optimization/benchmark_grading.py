@@ -0,0 +1,58 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# Modules shared by every app live in common/ next to the app directories
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import categorize_marks
+from grading import GRADES, band_edges, dd_threshold, grade_codes
+
+# Check grade_codes against categorize_marks at and around every cut point,
+# including the DD/FF median rule for even, odd and fractional medians
+def check_boundaries():
+    checked = 0
+    for sa, span, median in itertools.product(range(55, 101), range(1, 13), [60, 61, 70.5, 75.3, 88]):
+        lows, highs = band_edges(sa, span)
+        cuts = np.concatenate([lows, highs, [sa, dd_threshold(median), 0, 100, np.nan]])
+        marks = np.unique(np.concatenate([cuts + offset for offset in (-1, -0.5, -1e-9, 0, 1e-9, 0.5, 1)]))
+        expected = [categorize_marks(m, sa, span, median) for m in marks]
+        actual = [GRADES[code] for code in grade_codes(marks, sa, span, median)]
+        if actual != expected:
+            raise SystemExit(f'Mismatch for SA={sa}, Span={span}, median={median}')
+        checked += len(marks)
+    print(f'{checked} boundary marks graded identically')
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-row apply grading with the vectorized kernel.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000, 1000000])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    check_boundaries()
+
+    rng = np.random.default_rng(args.seed)
+    sa, span = 80, 9
+    print(f"{'N':>8} {'apply (s)':>10} {'vectorized (s)':>15} {'speedup':>9}")
+    for n in args.sizes:
+        marks = pd.Series(np.clip(rng.normal(75, 10, n), 0, 100))
+        median = marks.median()
+
+        start = time.perf_counter()
+        counts_apply = marks.apply(lambda x: categorize_marks(x, sa, span, median)).value_counts()
+        apply_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        counts = np.bincount(grade_codes(marks.to_numpy(), sa, span, median), minlength=len(GRADES))
+        vectorized_time = time.perf_counter() - start
+
+        if dict(zip(GRADES, counts)) != {g: counts_apply.get(g, 0) for g in GRADES}:
+            raise SystemExit(f'N={n}: grade counts differ')
+        print(f'{n:>8} {apply_time:>10.4f} {vectorized_time:>15.5f} {apply_time / vectorized_time:>8.0f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from common.metrics import stage
+
+# Charts are only drawn on Agg canvases; never let matplotlib pick an
+# interactive backend in a server process
+os.environ['MPLBACKEND'] = 'Agg'
+
+# Directory the charts are written to, served as /static
+CHART_DIR = 'static'
+
+# Whenever a chart is queued, charts older than CHART_TTL seconds and then
+# the oldest ones beyond MAX_CHARTS are removed from CHART_DIR
+CHART_TTL = 24 * 3600
+MAX_CHARTS = 1000
+CHART_PREFIX = 'grade_distribution_'
+
+# Charts rendered at the same time; rendering is CPU-bound and holds the GIL
+# for most of its time, so a couple of threads is enough to keep requests free
+CHART_WORKERS = 2
+
+_pool = ThreadPoolExecutor(max_workers=CHART_WORKERS, thread_name_prefix='chart')
+_pending = {}
+_pending_lock = threading.RLock()  # re-entered when a callback runs at once
+
+# File name of a grade distribution chart, derived from everything drawn on it
+# so that identical charts share a file and different ones never collide
+def chart_name(grade_counts, sa_value, subject_name):
+    content = json.dumps([{str(k): int(v) for k, v in grade_counts.items()}, str(sa_value), subject_name])
+    return f'{CHART_PREFIX}{hashlib.sha1(content.encode()).hexdigest()[:16]}.png'
+
+# Draw one bar chart with the object-oriented API and the Agg canvas, so
+# threads never share pyplot state and matplotlib is only imported on first use
+def _render(path, grade_counts, sa_value, subject_name):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    with stage('chart_render'):
+        fig = Figure(figsize=(12, 6))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        ax.bar([str(grade) for grade in grade_counts.keys()], list(grade_counts.values()), color='skyblue')
+        ax.set_title(f'Distribution of Grades (SA={sa_value}) for {subject_name}')
+        ax.set_xlabel('Grade')
+        ax.set_ylabel('Number of Students')
+        fig.tight_layout()
+
+        # Write under a temporary name so a half-written PNG is never served
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        fig.savefig(temporary, format='png')
+        os.replace(temporary, path)
+
+def _finished(path, future):
+    with _pending_lock:
+        _pending.pop(path, None)
+    if future.exception() is not None:
+        logging.error(f'Could not render chart {path}: {future.exception()}')
+
+# Queue a grade distribution chart and return its file name at once. Nothing
+# is drawn when the file already exists or the same chart is being drawn.
+def submit_chart(grade_counts, sa_value, subject_name):
+    grade_counts = dict(grade_counts)
+    name = chart_name(grade_counts, sa_value, subject_name)
+    path = os.path.join(CHART_DIR, name)
+    with _pending_lock:
+        if path not in _pending and not os.path.isfile(path):
+            os.makedirs(CHART_DIR, exist_ok=True)
+            evict_charts()
+            future = _pool.submit(_render, path, grade_counts, sa_value, subject_name)
+            _pending[path] = future
+            future.add_done_callback(lambda future: _finished(path, future))
+    return name
+
+# Remove expired charts and the oldest ones beyond MAX_CHARTS, keeping those
+# being drawn. A removed chart is drawn again if it is asked for again.
+def evict_charts():
+    charts = []
+    for name in os.listdir(CHART_DIR):
+        path = os.path.join(CHART_DIR, name)
+        if name.startswith(CHART_PREFIX) and name.endswith('.png') and path not in _pending:
+            try:
+                charts.append((os.path.getmtime(path), path))
+            except OSError:  # Removed by another worker meanwhile
+                pass
+    charts.sort(reverse=True)
+    expiry = time.time() - CHART_TTL
+    for i, (modified, path) in enumerate(charts):
+        if modified < expiry or i >= MAX_CHARTS - 1:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
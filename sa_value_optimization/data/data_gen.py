@@ -1,10 +1,22 @@
+import argparse
+import os
+import sys
+
 import pandas as pd
 import numpy as np
 
+# Modules shared by every app live in common/ at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.chunks import write_chunks
+
+# Rows generated and written at a time; memory stays bounded by one chunk
+DEFAULT_CHUNK_SIZE = 1000000
+
 def generate_student_grades(num_students=100, mean=75, std_dev=10, min_score=0, max_score=100):
     """
     Generate a dataset of student grades.
-    
+
     Parameters:
         num_students (int): The number of students to simulate.
         mean (float): The mean score of the distribution.
@@ -29,10 +41,45 @@ def generate_student_grades(num_students=100, mean=75, std_dev=10, min_score=0,
 
     return df
 
+def generate_grade_chunks(num_students, components=((75, 10, 1.0),), min_score=0, max_score=100,
+                          integer=False, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Generate student grades from a mixture of normal distributions, in chunks.
+
+    Each student is first assigned a component with probability proportional
+    to its weight, then drawn from that component's normal distribution. Two
+    components give the bimodal marks of a class split between students who
+    did and did not keep up.
+
+    Parameters:
+        num_students (int): The number of students to simulate.
+        components (list): (mean, std_dev, weight) of each component.
+        min_score (int): Minimum possible score.
+        max_score (int): Maximum possible score.
+        integer (bool): Round marks to whole numbers.
+        seed (int): Seed of the random generator.
+        chunk_size (int): Rows per yielded DataFrame.
+
+    Yields:
+        pd.DataFrame: Student_ID and Marks columns, at most chunk_size rows.
+    """
+    rng = np.random.default_rng(seed)
+    means, std_devs, weights = (np.asarray(values, dtype=float) for values in zip(*components))
+    weights = weights / weights.sum()
+
+    for start in range(0, num_students, chunk_size):
+        size = min(chunk_size, num_students - start)
+        component = rng.choice(len(weights), size=size, p=weights)
+        grades = np.clip(rng.normal(means[component], std_devs[component]), min_score, max_score)
+        if integer:
+            grades = np.rint(grades).astype(np.int64)
+        ids = pd.Series(np.arange(start + 1, start + size + 1)).astype(str)
+        yield pd.DataFrame({'Student_ID': 'STUD' + ids, 'Marks': grades})
+
 def save_dataset_to_csv(df, filename='student_grades.csv'):
     """
     Save the dataset to a CSV file.
-    
+
     Parameters:
         df (pd.DataFrame): The DataFrame to save.
         filename (str): The name of the output CSV file.
@@ -40,13 +87,33 @@ def save_dataset_to_csv(df, filename='student_grades.csv'):
     df.to_csv(filename, index=False)
     print(f'Dataset saved to {filename}')
 
-if __name__ == "__main__":
-    num_students = 100  # Number of students
-    mean_score = 75     # Mean score
-    std_dev = 10        # Standard deviation of scores
+def main():
+    parser = argparse.ArgumentParser(description='Generate student grades for SA value optimisation.')
+    parser.add_argument('--students', type=int, default=100, help='number of students')
+    parser.add_argument('--mean', type=float, default=75, help='mean score')
+    parser.add_argument('--std-dev', type=float, default=10, help='standard deviation of scores')
+    parser.add_argument('--second-mean', type=float, default=None,
+                        help='mean of a second group of students, for bimodal marks')
+    parser.add_argument('--second-std-dev', type=float, default=10)
+    parser.add_argument('--second-weight', type=float, default=0.3, help='share of students in the second group')
+    parser.add_argument('--min-score', type=float, default=0)
+    parser.add_argument('--max-score', type=float, default=100)
+    parser.add_argument('--integer', action='store_true', help='round marks to whole numbers')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=None,
+                        help='output format; inferred from the file name by default')
+    parser.add_argument('--output', default='student_grades.csv')
+    args = parser.parse_args()
 
-    # Generate dataset
-    student_grades = generate_student_grades(num_students, mean_score, std_dev)
+    components = [(args.mean, args.std_dev, 1.0)]
+    if args.second_mean is not None:
+        components = [(args.mean, args.std_dev, 1 - args.second_weight),
+                      (args.second_mean, args.second_std_dev, args.second_weight)]
+    chunks = generate_grade_chunks(args.students, components, args.min_score, args.max_score,
+                                   args.integer, args.seed, args.chunk_size)
+    rows = write_chunks(chunks, args.output, args.format)
+    print(f'Dataset of {rows} students saved to {args.output}')
 
-    # Save to CSV
-    save_dataset_to_csv(student_grades)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
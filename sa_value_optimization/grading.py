@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+# Grades from lowest to highest; a grade's integer code is its index here
+GRADES = ['FF', 'DD', 'CD', 'CC', 'BC', 'BB', 'AB', 'AA']
+FF, DD, AA = 0, 1, 7
+
+# Lowest DD mark for a given median, as in categorize_marks
+def dd_threshold(median):
+    return median / 2 if median % 2 == 0 else (median + 1) / 2
+
+# Inclusive (lows, highs) of the Span-wide bands CD, CC, BC, BB and AB
+def band_edges(SA, Span):
+    steps = np.arange(5, 0, -1)
+    return SA - steps * Span + 1, SA - (steps - 1) * Span
+
+# Integer grade codes for an array of marks, identical to categorize_marks.
+# Marks above SA are AA; marks inside a band get that band's grade; anything
+# else (below CD, or between two bands for fractional marks) is DD or FF
+# depending on the median rule.
+def grade_codes(marks, SA, Span, median):
+    if Span < 1:
+        raise ValueError("Span must be at least 1")
+    marks = np.asarray(marks, dtype=float)
+    lows, highs = band_edges(SA, Span)
+
+    # Highest band starting at or below each mark, then check its upper end
+    band = np.searchsorted(lows, marks, side='right') - 1
+    in_band = (band >= 0) & (marks <= highs[np.maximum(band, 0)])
+
+    codes = np.where(marks >= dd_threshold(median), DD, FF)
+    codes = np.where(in_band, band + 2, codes)
+    codes[marks > SA] = AA
+    return codes
+
+# Number of students per grade, indexed by grade code
+def grade_counts(codes):
+    return np.bincount(codes, minlength=len(GRADES))
+
+# Grade counts as returned by value_counts().sort_index(): present grades only
+def counts_series(counts):
+    series = pd.Series(counts, index=GRADES, name='count')
+    return series[series > 0].sort_index()
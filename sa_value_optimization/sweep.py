@@ -0,0 +1,157 @@
+from functools import lru_cache
+import numpy as np
+from grading import GRADES, band_edges, dd_threshold
+
+# Value of each grade (by code) in the normality test, as in calculate_normality
+GRADE_VALUES = np.arange(1, len(GRADES) + 1, dtype=float)
+
+# Grade counts for many (SA, Span) candidates at once, shape (candidates, 8).
+# The marks are sorted once; every band count is then the difference of two
+# binary searches, so no candidate re-grades the marks. Matches grade_codes.
+def grade_count_matrix(marks, sa_values, spans, median):
+    marks = np.asarray(marks, dtype=float)
+    sorted_marks = np.sort(marks[~np.isnan(marks)])
+    missing = len(marks) - len(sorted_marks)  # NaN marks are always FF
+    total = len(sorted_marks)
+
+    sa_values, spans = np.broadcast_arrays(np.asarray(sa_values, dtype=float), np.asarray(spans, dtype=float))
+    if np.any(spans < 1):
+        raise ValueError("Span must be at least 1")
+    lows, highs = band_edges(sa_values[:, None], spans[:, None])  # (candidates, 5) each, CD ... AB
+    dd = dd_threshold(median)
+
+    band_start = np.searchsorted(sorted_marks, lows, side='left')
+    band_end = np.searchsorted(sorted_marks, highs, side='right')
+    above_sa = np.searchsorted(sorted_marks, sa_values, side='right')
+    below_dd = np.searchsorted(sorted_marks, dd, side='left')
+
+    counts = np.zeros((len(sa_values), len(GRADES)), dtype=np.int64)
+    counts[:, 2:7] = band_end - band_start
+    counts[:, 7] = total - above_sa
+
+    # Marks below the DD threshold that are not in a band or AA are FF; the
+    # rest of the ungraded marks are DD
+    in_bands_below_dd = np.clip(np.minimum(band_end, below_dd) - band_start, 0, None).sum(axis=1)
+    aa_below_dd = np.clip(below_dd - above_sa, 0, None)
+    counts[:, 0] = below_dd - in_bands_below_dd - aa_below_dd + missing
+    counts[:, 1] = len(marks) - counts[:, [0, 2, 3, 4, 5, 6, 7]].sum(axis=1)
+    return counts
+
+# Shapiro-Wilk coefficients for a sample of size n, as a full antisymmetric
+# vector over the sorted sample (Royston's AS R94 approximation, as swilk)
+@lru_cache(maxsize=32)
+def shapiro_coefficients(n):
+    from scipy import special  # Imported on first use: scipy is slow to load
+
+    half = n // 2
+    coefficients = np.zeros(half)
+    if n == 3:
+        coefficients[0] = np.sqrt(0.5)
+    else:
+        m = special.ndtri((np.arange(1, half + 1) - 0.375) / (n + 0.25))
+        summ2 = 2 * np.sum(m ** 2)
+        ssumm2 = np.sqrt(summ2)
+        rsn = 1 / np.sqrt(n)
+        a1 = np.polyval([-2.706056, 4.434685, -2.071190, -0.147981, 0.221157, 0.0], rsn) - m[0] / ssumm2
+        if n > 5:
+            a2 = -m[1] / ssumm2 + np.polyval([-3.582633, 5.682633, -1.752461, -0.293762, 0.042981, 0.0], rsn)
+            fac = np.sqrt((summ2 - 2 * m[0] ** 2 - 2 * m[1] ** 2) / (1 - 2 * a1 ** 2 - 2 * a2 ** 2))
+            coefficients[2:] = -m[2:] / fac
+            coefficients[1] = a2
+        else:
+            fac = np.sqrt((summ2 - 2 * m[0] ** 2) / (1 - 2 * a1 ** 2))
+            coefficients[1:] = -m[1:] / fac
+        coefficients[0] = a1
+
+    full = np.zeros(n)
+    full[:half] = -coefficients
+    full[n - half:] = coefficients[::-1]
+    full.flags.writeable = False
+    return full
+
+# Shapiro-Wilk p-values for samples given as counts of each value.
+# counts has shape (samples, len(values)) and every row must sum to the same n.
+# Because a sorted sample of repeated values is a run per value, W only needs
+# prefix sums of the coefficients at the run boundaries. scipy.stats.shapiro
+# computes in single precision, so the two agree to a few 1e-7 relative.
+def shapiro_from_counts(counts, values=GRADE_VALUES):
+    counts = np.asarray(counts, dtype=np.int64)
+    n = int(counts[0].sum())
+    if n < 3:
+        raise ValueError("Data must be at least length 3.")
+    if np.any(counts.sum(axis=1) != n):
+        raise ValueError("All samples must have the same size")
+
+    coefficients = shapiro_coefficients(n)
+    prefix = np.concatenate([[0.0], np.cumsum(coefficients)])
+    boundaries = np.cumsum(counts, axis=1)
+    run_sums = np.diff(prefix[boundaries], axis=1, prepend=0.0)  # sum of coefficients over each run
+
+    # W as the squared correlation between the sorted sample and the coefficients
+    sax = run_sums @ values
+    total = counts @ values
+    ssx = counts @ values ** 2 - total ** 2 / n
+    ssa = np.sum(coefficients ** 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w = np.clip(sax ** 2 / (ssa * ssx), 0, 1)
+    return w, shapiro_p_values(w, n)
+
+# p-values of W statistics for sample size n (Royston 1995, as swilk)
+def shapiro_p_values(w, n):
+    from scipy import special
+
+    w = np.asarray(w, dtype=float)
+    if n == 3:
+        return np.maximum(0.0, 6 / np.pi * (np.arcsin(np.sqrt(w)) - np.pi / 3))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.log(1 - w)
+        if n <= 11:
+            gamma = np.polyval([0.459, -2.273], n)
+            beyond_gamma = y >= gamma
+            y = -np.log(gamma - y)
+            mean = np.polyval([-6.714e-4, 0.025054, -0.39978, 0.5440], n)
+            std = np.exp(np.polyval([-0.0020322, 0.062767, -0.77857, 1.3822], n))
+        else:
+            log_n = np.log(n)
+            mean = np.polyval([0.0038915, -0.083751, -0.31082, -1.5861], log_n)
+            std = np.exp(np.polyval([0.0030302, -0.082676, -0.4803], log_n))
+        p_values = special.ndtr(-(y - mean) / std)
+
+    if n <= 11:
+        p_values[beyond_gamma] = 1e-99
+    p_values[w >= 1] = 1.0
+    return p_values
+
+# Normality score of each row of grade counts, as calculate_normality:
+# the Shapiro-Wilk p-value, or 0 when everyone has the same grade
+def normality_from_counts(counts):
+    counts = np.asarray(counts)
+    _, p_values = shapiro_from_counts(counts)
+    p_values[(counts > 0).sum(axis=1) <= 1] = 0
+    return p_values
+
+# Score every (SA, Span) pair of the grid. Returns, per Span, the SA values,
+# their p-values and grade counts (candidates x grades).
+def sweep(marks, sa_values, spans, median):
+    sa_values = np.asarray(sa_values, dtype=float)
+    grid_sa = np.tile(sa_values, len(spans))
+    grid_span = np.repeat(np.asarray(spans, dtype=float), len(sa_values))
+    counts = grade_count_matrix(marks, grid_sa, grid_span, median)
+    p_values = normality_from_counts(counts)
+
+    results = {}
+    for i, span in enumerate(spans):
+        rows = slice(i * len(sa_values), (i + 1) * len(sa_values))
+        results[span] = (sa_values, p_values[rows], counts[rows])
+    return results
+
+# Best SA from start to stop - 1 (inclusive) from a sweep curve, matching the
+# range label '{start}-{stop - 1}' also for fractional SA values: the first
+# highest p-value, as analyze_distributions. Returns None when no candidate
+# scores above 0.
+def best_in_range(sa_values, p_values, start, stop):
+    candidates = np.flatnonzero((sa_values >= start) & (sa_values <= stop - 1))
+    if len(candidates) == 0 or p_values[candidates].max() <= 0:
+        return None
+    return candidates[np.argmax(p_values[candidates])]
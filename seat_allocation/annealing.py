@@ -0,0 +1,287 @@
+import random
+import math
+import time
+import numpy as np
+from seating import chain_neighbors, layout_conflicts
+
+# Floor for geometric cooling; exp(-1 / MIN_TEMPERATURE) is already 0.0
+MIN_TEMPERATURE = 1e-300
+
+# Iterations between two progress reports of simulated_annealing
+PROGRESS_INTERVAL = 1000
+
+# Initial configuration (random assignment)
+def random_assignment(students, rng=random):
+    assignment = list(range(len(students)))  # Seats are 0, 1, 2, ...
+    rng.shuffle(assignment)  # Shuffle to create random assignment
+    return assignment
+
+# Objective function to calculate the number of adjacent same-course pairs
+def objective_function(assignment, courses):
+    conflicts = 0
+    for i in range(len(assignment) - 1):
+        if courses[assignment[i]] == courses[assignment[i + 1]]:
+            conflicts += 1
+    return conflicts
+
+# Generate a neighbor solution by swapping two students
+def generate_neighbor(assignment):
+    neighbor = assignment[:]
+    idx1, idx2 = random.sample(range(len(assignment)), 2)
+    neighbor[idx1], neighbor[idx2] = neighbor[idx2], neighbor[idx1]
+    return neighbor
+
+# Count same-course pairs (p, p + 1) for the given left-hand seat positions
+def _pair_conflicts(assignment, courses, positions):
+    last = len(assignment) - 1
+    conflicts = 0
+    for p in positions:
+        if 0 <= p < last and courses[assignment[p]] == courses[assignment[p + 1]]:
+            conflicts += 1
+    return conflicts
+
+# Change in objective_function if the students in seats idx1 and idx2 swapped.
+# Only the (up to four) adjacent pairs touching the two seats are inspected;
+# the assignment is swapped in place and restored before returning.
+def swap_delta(assignment, courses, idx1, idx2):
+    positions = {idx1 - 1, idx1, idx2 - 1, idx2}
+    before = _pair_conflicts(assignment, courses, positions)
+    assignment[idx1], assignment[idx2] = assignment[idx2], assignment[idx1]
+    after = _pair_conflicts(assignment, courses, positions)
+    assignment[idx1], assignment[idx2] = assignment[idx2], assignment[idx1]
+    return after - before
+
+# Number of neighboring same-course pairs on a seating layout; courses[s] is
+# None for the empty seats padding the assignment
+def neighbor_conflicts(assignment, courses, neighbors):
+    conflicts = 0
+    for seat, around in enumerate(neighbors):
+        course = courses[assignment[seat]]
+        if course is not None:
+            conflicts += sum(1 for n in around if n >= 0 and courses[assignment[n]] == course)
+    return conflicts // 2
+
+# Change in neighbor_conflicts if the students in seats idx1 and idx2 swapped
+def layout_swap_delta(assignment, courses, neighbors, idx1, idx2):
+    course1 = courses[assignment[idx1]]
+    course2 = courses[assignment[idx2]]
+    if course1 == course2:
+        return 0
+
+    delta = 0
+    for seat, other, old, new in ((idx1, idx2, course1, course2), (idx2, idx1, course2, course1)):
+        for n in neighbors[seat]:
+            if n >= 0 and n != other:
+                course = courses[assignment[n]]
+                if course is not None:
+                    delta += (course == new) - (course == old)
+    return delta
+
+# Simulated annealing algorithm with incremental cost evaluation.
+# Draws the same random numbers as simulated_annealing_rescan, so for a fixed
+# seed both follow the same trajectory and return the same best cost.
+#
+# With a neighbors table (see seating.SeatingLayout) students are placed on
+# its seats instead of a single row; spare seats hold values >= len(courses).
+# A seed makes the run independent of the global random state.
+#
+# progress, if given, is called every PROGRESS_INTERVAL iterations with the
+# iteration, best cost and temperature; it may raise to stop the run.
+def simulated_annealing(students, courses, initial_temp=1000, cooling_rate=0.99, max_iterations=10000,
+                        neighbors=None, seed=None, progress=None):
+    rng = random if seed is None else random.Random(seed)
+    if neighbors is None:
+        current_solution = random_assignment(students, rng)
+        current_cost = objective_function(current_solution, courses)
+        delta = lambda a, b: swap_delta(current_solution, courses, a, b)
+    else:
+        if len(neighbors) < len(students):
+            raise ValueError(f'{len(students)} students do not fit in {len(neighbors)} seats')
+        courses = list(courses) + [None] * (len(neighbors) - len(students))
+        current_solution = random_assignment(neighbors, rng)
+        current_cost = neighbor_conflicts(current_solution, courses, neighbors)
+        delta = lambda a, b: layout_swap_delta(current_solution, courses, neighbors, a, b)
+    best_solution = None  # None while the current solution is the best one seen
+    best_cost = current_cost
+
+    temperature = initial_temp
+    seats = range(len(current_solution))
+
+    for iteration in range(max_iterations):
+        if progress is not None and iteration % PROGRESS_INTERVAL == 0:
+            progress(iteration=iteration, iterations=max_iterations, best_cost=best_cost, temperature=temperature)
+
+        idx1, idx2 = rng.sample(seats, 2)
+        cost_diff = delta(idx1, idx2)
+
+        # Decide whether to accept the neighbor solution
+        if cost_diff < 0 or rng.random() < math.exp(-cost_diff / temperature):
+            # Snapshot the best solution only when moving away from it
+            if best_solution is None and cost_diff >= 0:
+                best_solution = current_solution[:]
+
+            current_solution[idx1], current_solution[idx2] = current_solution[idx2], current_solution[idx1]
+            current_cost += cost_diff
+
+            # Update the best solution found
+            if current_cost < best_cost:
+                best_solution = None
+                best_cost = current_cost
+
+        # Cool down the temperature, stopping short of underflowing to zero
+        temperature = max(temperature * cooling_rate, MIN_TEMPERATURE)
+
+    if best_solution is None:
+        best_solution = current_solution
+    return best_solution, best_cost
+
+# Reference implementation that copies and rescans the whole assignment per step
+def simulated_annealing_rescan(students, courses, initial_temp=1000, cooling_rate=0.99, max_iterations=10000):
+    current_solution = random_assignment(students)
+    current_cost = objective_function(current_solution, courses)
+    best_solution = current_solution[:]
+    best_cost = current_cost
+
+    temperature = initial_temp
+
+    for iteration in range(max_iterations):
+        neighbor = generate_neighbor(current_solution)
+        neighbor_cost = objective_function(neighbor, courses)
+
+        # Calculate the cost difference
+        cost_diff = neighbor_cost - current_cost
+
+        # Decide whether to accept the neighbor solution
+        if cost_diff < 0 or random.random() < math.exp(-cost_diff / temperature):
+            current_solution = neighbor
+            current_cost = neighbor_cost
+
+            # Update the best solution found
+            if current_cost < best_cost:
+                best_solution = current_solution[:]
+                best_cost = current_cost
+
+        # Cool down the temperature, stopping short of underflowing to zero
+        temperature = max(temperature * cooling_rate, MIN_TEMPERATURE)
+
+    return best_solution, best_cost
+
+# Vectorized swap cost for a batch of chains on a seating layout: row r of
+# seat_codes swaps seats idx1[r] and idx2[r] (idx1 != idx2). Empty seats have
+# code -1 and never conflict. Seat codes are left untouched.
+def batched_swap_delta(seat_codes, neighbors, idx1, idx2):
+    rows = np.arange(seat_codes.shape[0])[:, None]
+    code1 = seat_codes[rows[:, 0], idx1][:, None]
+    code2 = seat_codes[rows[:, 0], idx2][:, None]
+
+    # Neighbors of each seat, excluding padding and the other swapped seat
+    around1 = neighbors[idx1]
+    around2 = neighbors[idx2]
+    codes1 = np.where(around1 >= 0, seat_codes[rows, around1], -1)
+    codes2 = np.where(around2 >= 0, seat_codes[rows, around2], -1)
+    codes1[around1 == idx2[:, None]] = -1
+    codes2[around2 == idx1[:, None]] = -1
+
+    # Conflicts gained at each seat minus conflicts lost
+    gained = ((codes1 == code2) & (code2 >= 0)).sum(axis=1) + ((codes2 == code1) & (code1 >= 0)).sum(axis=1)
+    lost = ((codes1 == code1) & (code1 >= 0)).sum(axis=1) + ((codes2 == code2) & (code2 >= 0)).sum(axis=1)
+    return gained - lost
+
+# Run num_chains independent annealing chains as rows of a NumPy array until
+# time_budget seconds have passed, or for max_steps steps when given. Students
+# are placed on the seats of the neighbors table (see seating.SeatingLayout);
+# without one they sit in a single row as in simulated_annealing. The
+# temperature decays geometrically from initial_temp to final_temp over the
+# budget. With max_steps the schedule follows the steps taken instead of the
+# clock and time_budget is ignored, so a seed reproduces the same run.
+#
+# Returns (seats, conflicts) for the best chain: seats[s] is the student in
+# seat s, or a value >= len(course_codes) for an empty seat. progress, if
+# given, is called every steps_per_check steps with the elapsed time, steps
+# taken and best cost so far; it may raise to stop the run.
+def batched_annealing(course_codes, neighbors=None, num_chains=16, time_budget=2.0, initial_temp=2.0,
+                      final_temp=0.05, steps_per_check=256, seed=None, progress=None, max_steps=None):
+    if num_chains < 1:
+        raise ValueError(f'num_chains must be at least 1, got {num_chains}')
+    if max_steps is None and not time_budget > 0:
+        raise ValueError(f'time_budget must be above 0, got {time_budget}')
+    if max_steps is not None and not max_steps > 0:
+        raise ValueError(f'max_steps must be above 0, got {max_steps}')
+    rng = np.random.default_rng(seed)
+    codes = np.asarray(course_codes)
+    if neighbors is None:
+        neighbors = chain_neighbors(len(codes))
+    num_seats = len(neighbors)
+    if num_seats < len(codes):
+        raise ValueError(f'{len(codes)} students do not fit in {num_seats} seats')
+    if num_seats < 2:
+        return np.arange(num_seats), 0
+
+    # Pad with empty seats (code -1) so every chain is a permutation of seats
+    padded_codes = np.concatenate([codes, np.full(num_seats - len(codes), -1, dtype=codes.dtype)])
+    rows = np.arange(num_chains)
+    chains = np.argsort(rng.random((num_chains, num_seats)), axis=1)
+    seat_codes = padded_codes[chains]
+    costs = np.array([layout_conflicts(row, neighbors) for row in seat_codes])
+    best_chains = chains.copy()
+    best_costs = costs.copy()
+    at_best = np.ones(num_chains, dtype=bool)  # Rows whose best is not yet snapshotted
+
+    start = time.perf_counter()
+    steps = 0
+    while True:
+        elapsed = time.perf_counter() - start
+        if progress is not None:
+            progress(elapsed=elapsed, time_budget=time_budget, steps=steps, best_cost=int(best_costs.min()))
+        done = steps / max_steps if max_steps is not None else elapsed / time_budget
+        if done >= 1:
+            break
+        steps += steps_per_check
+        temperature = initial_temp * (final_temp / initial_temp) ** done
+
+        for step in range(steps_per_check):
+            idx1 = rng.integers(0, num_seats, num_chains)
+            idx2 = rng.integers(0, num_seats - 1, num_chains)
+            idx2 += idx2 >= idx1
+            cost_diff = batched_swap_delta(seat_codes, neighbors, idx1, idx2)
+
+            # Metropolis acceptance for all chains at once
+            accept = (cost_diff < 0) | (rng.random(num_chains) < np.exp(-np.maximum(cost_diff, 0) / temperature))
+
+            # Snapshot best solutions only for chains moving away from them
+            leaving = at_best & accept & (cost_diff >= 0)
+            if leaving.any():
+                best_chains[leaving] = chains[leaving]
+                at_best &= ~leaving
+
+            r, a, b = rows[accept], idx1[accept], idx2[accept]
+            chains[r, a], chains[r, b] = chains[r, b], chains[r, a]
+            seat_codes[r, a], seat_codes[r, b] = seat_codes[r, b], seat_codes[r, a]
+            costs += np.where(accept, cost_diff, 0)
+
+            improved = costs < best_costs
+            best_costs[improved] = costs[improved]
+            at_best |= improved
+
+    best_chains[at_best] = chains[at_best]
+    winner = int(np.argmin(best_costs))
+    return best_chains[winner], int(best_costs[winner])
+
+# Number of batched_annealing steps that fit in time_budget seconds on this
+# machine, measured on a short probe run (which takes probe_fraction of the
+# budget; the steps are for the rest of it). Rounded to whole checks.
+def steps_for_budget(course_codes, neighbors=None, num_chains=16, time_budget=2.0, steps_per_check=256,
+                     probe_fraction=0.1):
+    if not time_budget > 0:
+        raise ValueError(f'time_budget must be above 0, got {time_budget}')
+    measured = {}
+
+    def record(elapsed, steps, **_):
+        measured['elapsed'], measured['steps'] = elapsed, steps
+
+    probe = time_budget * probe_fraction
+    batched_annealing(course_codes, neighbors, num_chains, time_budget=probe, steps_per_check=steps_per_check,
+                      seed=0, progress=record)
+    rate = measured['steps'] / measured['elapsed'] if measured.get('elapsed') else 0
+    checks = int(rate * (time_budget - probe) / steps_per_check)
+    return max(checks, 1) * steps_per_check
@@ -1,106 +1,220 @@
-from flask import Flask, request, send_file, render_template
-import pandas as pd
-import random
-import math
+from flask import Blueprint, Flask, Response, current_app, request, render_template, jsonify
+import numpy as np
 import csv
-from io import StringIO, BytesIO
-
-app = Flask(__name__)
-
-# Initial configuration (random assignment)
-def random_assignment(students):
-    assignment = list(range(len(students)))  # Seats are 0, 1, 2, ...
-    random.shuffle(assignment)  # Shuffle to create random assignment
-    return assignment
-
-# Objective function to calculate the number of adjacent same-course pairs
-def objective_function(assignment, courses):
-    conflicts = 0
-    for i in range(len(assignment) - 1):
-        if courses[assignment[i]] == courses[assignment[i + 1]]:
-            conflicts += 1
-    return conflicts
-
-# Generate a neighbor solution by swapping two students
-def generate_neighbor(assignment):
-    neighbor = assignment[:]
-    idx1, idx2 = random.sample(range(len(assignment)), 2)
-    neighbor[idx1], neighbor[idx2] = neighbor[idx2], neighbor[idx1]
-    return neighbor
-
-# Simulated annealing algorithm
-def simulated_annealing(students, courses, initial_temp=1000, cooling_rate=0.99, max_iterations=10000):
-    current_solution = random_assignment(students)
-    current_cost = objective_function(current_solution, courses)
-    best_solution = current_solution[:]
-    best_cost = current_cost
-
-    temperature = initial_temp
-
-    for iteration in range(max_iterations):
-        neighbor = generate_neighbor(current_solution)
-        neighbor_cost = objective_function(neighbor, courses)
-
-        # Calculate the cost difference
-        cost_diff = neighbor_cost - current_cost
-
-        # Decide whether to accept the neighbor solution
-        if cost_diff < 0 or random.random() < math.exp(-cost_diff / temperature):
-            current_solution = neighbor
-            current_cost = neighbor_cost
-
-            # Update the best solution found
-            if current_cost < best_cost:
-                best_solution = current_solution[:]
-                best_cost = current_cost
-
-        # Cool down the temperature
-        temperature *= cooling_rate
-
-    return best_solution, best_cost
+import os
+import secrets
+from io import StringIO
+import sys
+
+# Modules shared by every app live in common/ next to the app directories
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from annealing import batched_annealing, steps_for_budget
+from seating import SeatingLayout, DEFAULT_ROOMS, parse_rooms
+from restarts import parallel_restarts
+from common.ingest import DEFAULT_CACHE_BYTES, FrameCache, read_frame
+from common.jobs import DEFAULT_JOB_TTL, DEFAULT_JOB_WORKERS, JobManager
+from common.metrics import init_metrics, stage
+
+# Routes of the service; create_app registers them on each new app
+bp = Blueprint('seat_allocation', __name__)
+
+# Annealing limits for a single /assign-seats request
+DEFAULT_TIME_BUDGET = 2.0  # seconds
+MAX_TIME_BUDGET = 30.0
+DEFAULT_CHAINS = 16
+MAX_CHAINS = 256
+DEFAULT_ITERATIONS = 100000  # per restart in 'restarts' mode
+MAX_ITERATIONS = 1000000
+MAX_RESTARTS = 64
+MAX_STEPS = 1000000  # per chain in the batched mode
+
+# Approximate size of each chunk of the streamed CSV response
+OUTPUT_CHUNK_SIZE = 64 * 1024
+
+# Columns read from an uploaded student list
+STUDENT_COLUMNS = ['UID', 'Course']
+
+# Students of an uploaded CSV, Parquet or Arrow file as (uids, course_codes,
+# labels). Course names are coded as small integers in order of first
+# appearance. Files seen before are not parsed again but taken from cache.
+def read_students(file, cache):
+    return cache.load(file, 'students', parse_students)
+
+def parse_students(upload):
+    df = read_frame(upload.source, upload.format, columns=STUDENT_COLUMNS, dtype={'UID': str, 'Course': 'category'})
+    if 'UID' not in df.columns or 'Course' not in df.columns:
+        raise ValueError("CSV file must contain 'UID' and 'Course' columns.")
+    course_codes, labels = df['Course'].factorize()
+    return df['UID'].to_numpy(dtype=object), course_codes.astype(np.intc), list(labels)
+
+# Yield the seat assignment as CSV text in chunks of about OUTPUT_CHUNK_SIZE
+def stream_assignment(assignment, layout, uids, course_codes, labels):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['Seat', 'UID', 'Course', 'Room', 'Row', 'Column'])
+
+    for seat, student_idx in enumerate(assignment):
+        if student_idx >= len(uids):
+            continue  # Empty seat
+        room, room_seat, row, col = layout.describe_seat(seat)
+        writer.writerow([room_seat, uids[student_idx], labels[course_codes[student_idx]], room, row, col])
+        if buffer.tell() >= OUTPUT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
 
 # Route to serve the HTML form
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-# API route to handle the seat assignment process
-@app.route('/assign-seats', methods=['POST'])
+# Run simulated annealing algorithm: either seeded restarts spread over all
+# cores, or vectorized chains for a fixed number of steps. Without steps,
+# the number that fits in time_budget on this machine is measured first.
+# Returns (assignment, conflicts, seed, steps); the same seed and steps (or
+# restarts and iterations) give the same assignment again. steps is None in
+# restarts mode.
+def allocate(course_codes, layout, seed, mode=None, restarts=None, iterations=DEFAULT_ITERATIONS,
+             time_budget=DEFAULT_TIME_BUDGET, chains=DEFAULT_CHAINS, steps=None, progress=None):
+    if mode == 'restarts':
+        with stage('restarts'):
+            assignment, conflicts, seed = parallel_restarts(
+                course_codes, layout.neighbors, restarts=restarts or os.cpu_count() or 1, base_seed=seed,
+                max_iterations=iterations, progress=progress)
+        return assignment, conflicts, seed, None
+    with stage('annealing'):
+        if steps is None:
+            steps = steps_for_budget(course_codes, layout.neighbors, num_chains=chains, time_budget=time_budget)
+        assignment, conflicts = batched_annealing(course_codes, layout.neighbors, num_chains=chains,
+                                                  time_budget=time_budget, seed=seed, progress=progress,
+                                                  max_steps=steps)
+    return assignment, conflicts, seed, steps
+
+# Stream the CSV back instead of building the whole file in memory. X-Seed,
+# with X-Steps in the batched mode, reproduces the allocation when sent back
+# as seed and steps.
+def assignment_response(assignment, conflicts, seed, steps, layout, students, course_codes, labels):
+    headers = {
+        'Content-Disposition': 'attachment; filename=seat_assignment.csv',
+        'X-Seed': str(seed),
+        'X-Conflicts': str(conflicts),
+    }
+    if steps is not None:
+        headers['X-Steps'] = str(steps)
+    return Response(stream_assignment(assignment, layout, students, course_codes, labels),
+                    mimetype='text/csv', headers=headers)
+
+# Background allocation: the result keeps what assignment_response needs
+def allocation_job(students, course_codes, labels, layout, seed, progress=None, **options):
+    assignment, conflicts, seed, steps = allocate(course_codes, layout, seed, progress=progress, **options)
+    return assignment, conflicts, seed, steps, layout, students, course_codes, labels
+
+# API route to handle the seat assignment process. With async=1 the
+# allocation runs as a background job and its id is returned at once.
+@bp.route('/assign-seats', methods=['POST'])
 def assign_seats():
     # Load the input CSV
-    file = request.files['file']
-    df = pd.read_csv(file)
-
-    students = df['UID'].tolist()
-    courses = df['Course'].tolist()
-    rooms = ['609', '601', '701', '605', '603']  # Define rooms
-
-    # Run simulated annealing algorithm
-    best_assignment, best_conflicts = simulated_annealing(students, courses)
-
-    # Prepare the CSV output using StringIO first
-    output_string = StringIO()  # Use StringIO for text output
-    writer = csv.writer(output_string)
-
-    writer.writerow(['Seat', 'UID', 'Course', 'Room'])
-
-    current_capacity = 0
-    current_room = 0
-    limit = 35
-
-    for seat, student_idx in enumerate(best_assignment):
-        if current_capacity >= limit:
-            current_room += 1
-            current_capacity = 0
-        current_capacity += 1
-        writer.writerow([((seat) % limit) + 1, students[student_idx], courses[student_idx], rooms[current_room]])
-
-    # Now convert the StringIO output to bytes
-    output_string.seek(0)  # Move to the beginning of the StringIO stream
-    output_bytes = BytesIO(output_string.getvalue().encode('utf-8'))  # Convert to bytes
-
-    # Return the CSV file as a response
-    return send_file(output_bytes, mimetype='text/csv', as_attachment=True, download_name='seat_assignment.csv')
+    try:
+        with stage('read_upload'):
+            students, course_codes, labels = read_students(request.files['file'], current_app.extensions['upload_cache'])
+
+        # Rooms as NAME:ROWSxCOLUMNS and the neighbor stencil to check around each seat
+        with stage('layout'):
+            rooms = parse_rooms(request.form['rooms']) if request.form.get('rooms') else DEFAULT_ROOMS
+            layout = SeatingLayout(rooms, stencil=request.form.get('stencil', 'king'))
+
+        # Seed (and steps) reported with the result so an allocation can be reproduced
+        seed = int(request.form['seed']) if request.form.get('seed') else secrets.randbits(32)
+        options = {
+            'mode': request.form.get('mode'),
+            'restarts': int(request.form['restarts']) if request.form.get('restarts') else None,
+            'iterations': int(request.form.get('iterations', DEFAULT_ITERATIONS)),
+            'time_budget': float(request.form.get('time_budget', DEFAULT_TIME_BUDGET)),
+            'chains': int(request.form.get('chains', DEFAULT_CHAINS)),
+            'steps': int(request.form['steps']) if request.form.get('steps') else None,
+        }
+        if not 0 < options['time_budget'] <= MAX_TIME_BUDGET:
+            raise ValueError(f'time_budget must be above 0 and at most {MAX_TIME_BUDGET} seconds')
+        if options['steps'] is not None and not 0 < options['steps'] <= MAX_STEPS:
+            raise ValueError(f'steps must be between 1 and {MAX_STEPS}')
+        if options['restarts'] is not None and not 0 < options['restarts'] <= MAX_RESTARTS:
+            raise ValueError(f'restarts must be between 1 and {MAX_RESTARTS}')
+        if not 0 < options['iterations'] <= MAX_ITERATIONS:
+            raise ValueError(f'iterations must be between 1 and {MAX_ITERATIONS}')
+        if not 0 < options['chains'] <= MAX_CHAINS:
+            raise ValueError(f'chains must be between 1 and {MAX_CHAINS}')
+        if seed < 0:
+            raise ValueError('seed must not be negative')
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    if len(students) > layout.capacity:
+        return jsonify({'error': f'{len(students)} students do not fit in {layout.capacity} seats'}), 400
+
+    if request.form.get('async'):
+        job = current_app.extensions['jobs'].submit(allocation_job, students, course_codes, labels, layout, seed,
+                                                    **options)
+        return jsonify({'jobId': job.id, 'statusUrl': f'/jobs/{job.id}'}), 202
+
+    return assignment_response(*allocation_job(students, course_codes, labels, layout, seed, **options))
+
+# Status and progress of a background job
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = current_app.extensions['jobs'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+# Seat assignment CSV of a finished job
+@bp.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = current_app.extensions['jobs'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.state != 'done':
+        return jsonify({'error': f'Job is {job.state}', 'job': job.to_dict()}), 409
+    return assignment_response(*job.result)
+
+# Cancel a queued or running job
+@bp.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = current_app.extensions['jobs'].cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 202
+
+# Build the app. Settings are the defaults below, overridden by FLASK_*
+# environment variables (FLASK_WARM_UP=1, FLASK_JOB_WORKERS=4,
+# FLASK_PROFILING=1, ...) and then by config. Background allocations started
+# with async=1 run on the app's own JobManager, and parsed uploads are kept
+# in a cache of at most UPLOAD_CACHE_BYTES. Request and stage latencies are
+# served on /metrics. Serve with e.g. gunicorn --preload 'app:create_app()'.
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.from_mapping(WARM_UP=False, JOB_WORKERS=DEFAULT_JOB_WORKERS, JOB_TTL=DEFAULT_JOB_TTL,
+                            UPLOAD_CACHE_BYTES=DEFAULT_CACHE_BYTES)
+    app.config.from_prefixed_env()
+    app.config.from_mapping(config or {})
+
+    app.extensions['jobs'] = JobManager(app.config['JOB_WORKERS'], app.config['JOB_TTL'])
+    app.extensions['upload_cache'] = FrameCache(app.config['UPLOAD_CACHE_BYTES'])
+    app.register_blueprint(bp)
+    init_metrics(app)
+    if app.config['WARM_UP']:
+        warm_up()
+    return app
+
+# Run the annealing kernel once on a tiny problem so the NumPy code paths
+# of a first request are already loaded. Meant to run before workers fork
+# (gunicorn --preload) so they share the pages; leaves no threads behind.
+def warm_up():
+    layout = SeatingLayout(DEFAULT_ROOMS)
+    course_codes = np.arange(layout.capacity // 2, dtype=np.intc) % 3
+    batched_annealing(course_codes, layout.neighbors, num_chains=2, time_budget=0.01, seed=0)
+    layout.describe_seat(0)
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,38 @@
+import argparse
+import random
+import time
+
+from annealing import simulated_annealing, simulated_annealing_rescan
+
+COURSES = ['DL', 'ML', 'AI', 'DB', 'WE', 'OS', 'SE']
+
+# Time one annealing run from a fixed seed
+def run(engine, students, courses, seed, iterations):
+    random.seed(seed)
+    start = time.perf_counter()
+    _, best_cost = engine(students, courses, max_iterations=iterations)
+    return time.perf_counter() - start, best_cost
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare incremental and full-rescan seat annealing.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'N':>8} {'rescan (s)':>12} {'incremental (s)':>16} {'speedup':>9} {'best cost':>10}")
+    for n in args.sizes:
+        rng = random.Random(args.seed)
+        courses = [rng.choice(COURSES) for _ in range(n)]
+        students = list(range(n))
+
+        rescan_time, rescan_cost = run(simulated_annealing_rescan, students, courses, args.seed, args.iterations)
+        incremental_time, incremental_cost = run(simulated_annealing, students, courses, args.seed, args.iterations)
+        if rescan_cost != incremental_cost:
+            raise SystemExit(f'N={n}: best cost mismatch ({rescan_cost} vs {incremental_cost})')
+
+        print(f'{n:>8} {rescan_time:>12.3f} {incremental_time:>16.4f} '
+              f'{rescan_time / incremental_time:>8.0f}x {incremental_cost:>10}')
+
+if __name__ == '__main__':
+    main()
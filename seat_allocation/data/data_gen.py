@@ -1,26 +1,68 @@
+import argparse
+import os
+import sys
+from math import gcd
+
+import numpy as np
 import pandas as pd
-from faker import Faker
-import random
 
-# Initialize Faker
-fake = Faker()
+# Modules shared by every app live in common/ at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-# Number of students to generate
-num_students = 100  # Change this to generate more or fewer students
+from common.chunks import write_chunks
 
 # List of example courses
-courses = ['DL', 'ML', 'AI', 'DB', 'WE', 'OS', 'SE']
+COURSES = ['DL', 'ML', 'AI', 'DB', 'WE', 'OS', 'SE']
+
+# Student UIDs are drawn from this range, without repeats; it is extended
+# past UID_HIGH when more students are asked for than it holds
+UID_LOW, UID_HIGH = 201700000, 202300000
+
+# Rows generated and written at a time; memory stays bounded by one chunk
+DEFAULT_CHUNK_SIZE = 1000000
+
+# Share of students in each course, by popularity rank: rank ** -skew,
+# normalised. A skew of 0 is uniform; around 1 is Zipf-like.
+def course_weights(num_courses, skew=0.0):
+    weights = np.arange(1, num_courses + 1, dtype=float) ** -skew
+    return weights / weights.sum()
+
+# Yield DataFrames of UID and Course columns, chunk_size rows at a time.
+# UIDs are an affine permutation of the UID range (i * step + offset modulo
+# its size), so they look random yet never repeat without holding the range
+# in memory. Which course is the most popular is drawn from the seed too.
+def generate_students(num_students, courses=COURSES, skew=0.0, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    span = max(UID_HIGH - UID_LOW + 1, num_students)
+    rng = np.random.default_rng(seed)
+    courses = np.asarray(courses)[rng.permutation(len(courses))]
+    weights = course_weights(len(courses), skew)
+    step = int(rng.integers(span // 3, 2 * span // 3))
+    while gcd(step, span) != 1:
+        step += 1
+    offset = int(rng.integers(span))
 
-# Generate student data
-student_data = {
-    'UID': [f'{random.randint(201700000, 202300000)}' for _ in range(num_students)],
-    'Course': [random.choice(courses) for _ in range(num_students)],
-}
+    for start in range(0, num_students, chunk_size):
+        index = np.arange(start, min(start + chunk_size, num_students), dtype=np.int64)
+        yield pd.DataFrame({
+            'UID': UID_LOW + (index * step + offset) % span,
+            'Course': courses[rng.choice(len(courses), size=len(index), p=weights)],
+        })
 
-# Create a DataFrame
-df = pd.DataFrame(student_data)
+def main():
+    parser = argparse.ArgumentParser(description='Generate student UID and course data for seat allocation.')
+    parser.add_argument('--students', type=int, default=100, help='number of students to generate')
+    parser.add_argument('--courses', nargs='+', default=COURSES)
+    parser.add_argument('--skew', type=float, default=0.0, help='course popularity skew, 0 for uniform')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=None,
+                        help='output format; inferred from the file name by default')
+    parser.add_argument('--output', default='generated_students.csv')
+    args = parser.parse_args()
 
-# Save to CSV
-df.to_csv('generated_students.csv', index=False)
+    chunks = generate_students(args.students, args.courses, args.skew, args.seed, args.chunk_size)
+    rows = write_chunks(chunks, args.output, args.format)
+    print(f"Generated {rows} student records and saved to '{args.output}'.")
 
-print(f"Generated {num_students} student records and saved to 'generated_students.csv'.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
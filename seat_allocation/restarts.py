@@ -0,0 +1,87 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+import numpy as np
+from annealing import simulated_annealing
+
+# Seconds between two progress reports while restarts run
+PROGRESS_SECONDS = 0.5
+
+# Shared best cost of a restart that has not reported yet
+NO_COST = np.iinfo(np.int64).max
+
+# Per-worker copies of the encoded problem and the state shared with the
+# parent, set once by _init_worker
+_course_codes = None
+_neighbors = None
+_stop = None
+_iterations = None
+_best_costs = None
+
+class RestartsStopped(Exception):
+    """Raised inside a worker once the parent asked the restarts to stop."""
+
+def _init_worker(course_codes, neighbors, stop, iterations, best_costs):
+    global _course_codes, _neighbors, _stop, _iterations, _best_costs
+    _course_codes = course_codes.tolist()
+    _neighbors = None if neighbors is None else neighbors.tolist()
+    _stop, _iterations, _best_costs = stop, iterations, best_costs
+
+# Publish the progress of restart `index` to the parent, and stop the run
+# once the parent set the stop event
+def _report(index, iteration, best_cost, **_):
+    _iterations[index] = iteration
+    _best_costs[index] = best_cost
+    if _stop.is_set():
+        raise RestartsStopped()
+
+def _run_restart(index, seed, max_iterations, options):
+    seats, cost = simulated_annealing(_course_codes, _course_codes, max_iterations=max_iterations,
+                                      neighbors=_neighbors, seed=seed,
+                                      progress=lambda **state: _report(index, **state), **options)
+    _iterations[index] = max_iterations
+    return cost, seed, np.asarray(seats, dtype=np.int32)
+
+# Run `restarts` seeded simulated_annealing runs across a process pool.
+# The integer course codes and neighbor table are sent to each worker once,
+# when it starts, rather than with every task. Seeds are base_seed,
+# base_seed + 1, ... so a run can be reproduced from the returned seed.
+#
+# Returns (seats, conflicts, seed) for the best restart; ties go to the
+# lowest seed. progress, if given, is called every PROGRESS_SECONDS and as
+# each restart finishes with the restarts done, the iterations done over
+# all restarts and the best cost so far; the workers share these through
+# multiprocessing memory. If progress raises, the workers are told to stop,
+# which they do within simulated_annealing's PROGRESS_INTERVAL iterations,
+# and the exception is re-raised at once without waiting for them.
+def parallel_restarts(course_codes, neighbors=None, restarts=8, base_seed=0, max_iterations=10000,
+                      max_workers=None, progress=None, **options):
+    if restarts < 1 or max_iterations < 1:
+        raise ValueError(f'restarts and max_iterations must be at least 1, got {restarts} and {max_iterations}')
+    course_codes = np.asarray(course_codes, dtype=np.int32)
+    seeds = range(base_seed, base_seed + restarts)
+    context = multiprocessing.get_context()
+    stop = context.Event()
+    iterations = context.RawArray('q', restarts)
+    best_costs = context.RawArray('q', [NO_COST] * restarts)
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=_init_worker,
+                               initargs=(course_codes, neighbors, stop, iterations, best_costs))
+    results = []
+    finished = False
+    try:
+        pending = {pool.submit(_run_restart, index, seed, max_iterations, options)
+                   for index, seed in enumerate(seeds)}
+        while pending:
+            done, pending = wait(pending, timeout=PROGRESS_SECONDS, return_when=FIRST_COMPLETED)
+            results.extend(future.result() for future in done)
+            if progress is not None:
+                best_cost = min([*best_costs, *(result[0] for result in results)])
+                progress(restarts_done=len(results), restarts=restarts, iterations_done=sum(iterations),
+                         iterations=restarts * max_iterations, best_cost=None if best_cost == NO_COST else best_cost)
+        finished = True
+    finally:
+        if not finished:
+            stop.set()
+        pool.shutdown(wait=finished, cancel_futures=True)
+
+    cost, seed, seats = min(results, key=lambda result: result[:2])
+    return seats, cost, seed
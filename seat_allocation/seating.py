@@ -0,0 +1,76 @@
+import numpy as np
+
+# Neighbor offsets (row, column) checked around each seat
+STENCILS = {
+    'row': [(0, -1), (0, 1)],
+    'cross': [(0, -1), (0, 1), (-1, 0), (1, 0)],
+    'king': [(0, -1), (0, 1), (-1, 0), (1, 0), (-1, -1), (-1, 1), (1, -1), (1, 1)],
+}
+
+# Exam halls used when a request does not describe its own: (name, rows, columns)
+DEFAULT_ROOMS = [('609', 5, 7), ('601', 5, 7), ('701', 5, 7), ('605', 5, 7), ('603', 5, 7)]
+
+class SeatingLayout:
+    """Seats of one or more rooms, each a rows x columns grid.
+
+    Seats are numbered room by room in row-major order. `neighbors` is a
+    (seats x stencil size) table of neighboring seat indices, padded with -1,
+    so the cost change of a swap can be computed in constant time. Neighbors
+    never cross room boundaries.
+    """
+
+    def __init__(self, rooms=DEFAULT_ROOMS, stencil='king'):
+        if stencil not in STENCILS:
+            raise ValueError(f"Unknown stencil '{stencil}', expected one of {sorted(STENCILS)}")
+        self.rooms = [(name, int(rows), int(cols)) for name, rows, cols in rooms]
+        self.stencil = stencil
+
+        room_ids, seat_rows, seat_cols, tables = [], [], [], []
+        offset = 0
+        for room_id, (_, rows, cols) in enumerate(self.rooms):
+            r, c = np.divmod(np.arange(rows * cols), cols)
+            table = np.full((rows * cols, len(STENCILS[stencil])), -1, dtype=np.int64)
+            for k, (dr, dc) in enumerate(STENCILS[stencil]):
+                nr, nc = r + dr, c + dc
+                inside = (nr >= 0) & (nr < rows) & (nc >= 0) & (nc < cols)
+                table[inside, k] = offset + nr[inside] * cols + nc[inside]
+            room_ids.append(np.full(rows * cols, room_id))
+            seat_rows.append(r)
+            seat_cols.append(c)
+            tables.append(table)
+            offset += rows * cols
+
+        self.capacity = offset
+        self.seat_room = np.concatenate(room_ids) if room_ids else np.zeros(0, dtype=np.int64)
+        self.seat_row = np.concatenate(seat_rows) if seat_rows else np.zeros(0, dtype=np.int64)
+        self.seat_col = np.concatenate(seat_cols) if seat_cols else np.zeros(0, dtype=np.int64)
+        self.neighbors = np.vstack(tables) if tables else np.zeros((0, len(STENCILS[stencil])), dtype=np.int64)
+
+    # Room name, 1-based seat number within the room, row and column of a seat
+    def describe_seat(self, seat):
+        name, _, cols = self.rooms[self.seat_room[seat]]
+        row, col = int(self.seat_row[seat]), int(self.seat_col[seat])
+        return name, row * cols + col + 1, row + 1, col + 1
+
+# Layout of n seats in a single row, matching the original flat seat list
+def chain_neighbors(n):
+    return SeatingLayout([('', 1, n)], stencil='row').neighbors
+
+# Parse a room specification such as "609:5x7,601:6x8"
+def parse_rooms(spec):
+    rooms = []
+    for item in spec.split(','):
+        name, _, size = item.strip().partition(':')
+        rows, _, cols = size.lower().partition('x')
+        if not name or not rows.isdigit() or not cols.isdigit():
+            raise ValueError(f"Invalid room '{item.strip()}', expected NAME:ROWSxCOLUMNS")
+        rooms.append((name, int(rows), int(cols)))
+    return rooms
+
+# Number of neighboring seat pairs taken by students of the same course.
+# seat_codes holds the course code of each seat, or -1 for an empty seat.
+def layout_conflicts(seat_codes, neighbors):
+    seat_codes = np.asarray(seat_codes)
+    neighbor_codes = np.where(neighbors >= 0, seat_codes[neighbors], -1)
+    same = (neighbor_codes == seat_codes[:, None]) & (seat_codes[:, None] >= 0)
+    return int(same.sum()) // 2
@@ -1,37 +1,59 @@
-from flask import Flask, request, jsonify, send_file, render_template
+from flask import Blueprint, Flask, current_app, request, jsonify, send_file, render_template
 import pandas as pd
-import networkx as nx
-import matplotlib.pyplot as plt
-import random
-from datetime import datetime
-import itertools
+import json
 import os
 import logging
+import sys
 
-app = Flask(__name__)
+# Modules shared by every app live in common/ next to the app directories
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coloring import dsatur, improve_coloring, slot_dates
+from solver import DEFAULT_TIME_LIMIT, MAX_TIME_LIMIT, back_to_back_students, solve_timetable
+from rooms import DEFAULT_ROOM_CAPACITY, pack_rooms, parse_capacities
+from conflicts import conflict_graph
+from charts import submit_network_image, is_rendering
+from common.jobs import DEFAULT_JOB_TTL, DEFAULT_JOB_WORKERS, JobManager
+from common.metrics import init_metrics, stage
+from storage import ARTIFACT_DIR, ARTIFACT_TTL, MAX_ARTIFACTS, UPLOAD_DIR, ArtifactStore, UploadStore
+
+# Routes of the service; create_app registers them on each new app
+bp = Blueprint('time_table_gen', __name__)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
-# Global variable to store uploaded CSV path
-uploaded_csv_path = ''
+# Node colours of the class network image, cycled by slot id
+SLOT_COLORS = ["lightcoral", "gray", "lightgray", "firebrick", "red", "chocolate", "darkorange",
+               "moccasin", "gold", "yellow", "darkolivegreen", "chartreuse", "forestgreen",
+               "lime", "mediumaquamarine", "turquoise", "teal", "cadetblue", "dodgerblue",
+               "blue", "slateblue", "blueviolet", "magenta", "lightsteelblue"]
+UNSCHEDULED_COLOR = "white"
+
+# Scheduling engines of /generate_timetable
+ENGINES = ('greedy', 'cpsat')
+
+# Files written for every generated timetable
+TIMETABLE_FILE = 'timetable.csv'
+SUMMARY_FILE = 'summary.json'
+IMAGE_FILE = 'class_network.png'
 
-@app.route('/')
+@bp.route('/')
 def index():
     """Render the main index page."""
     return render_template('index.html')
 
-@app.route('/upload', methods=['POST'])
+@bp.route('/upload', methods=['POST'])
 def upload():
     """Handle file upload.
 
-    Expects a file to be uploaded in a POST request. 
-    Saves the uploaded file to the 'uploads' directory and logs the action.
+    Expects a CSV, Parquet or Arrow file to be uploaded in a POST request.
+    Stores it under an upload id derived from its content, parses its class
+    network once and logs the action.
 
     Returns:
-        JSON response with a success message or an error message.
+        JSON response with the upload id or an error message.
     """
-    global uploaded_csv_path
     if 'file' not in request.files:
         return jsonify({'error': 'No file uploaded'}), 400
     
@@ -39,152 +61,316 @@ def upload():
     
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
-    
-    uploaded_csv_path = os.path.join('uploads', file.filename)
-    file.save(uploaded_csv_path)
-    logging.info(f'Uploaded file saved at: {uploaded_csv_path}')
-    return jsonify({'message': 'File uploaded successfully'}), 200
 
-@app.route('/generate_timetable', methods=['GET'])
+    try:
+        upload_id = current_app.extensions['uploads'].save(file)
+    except (ValueError, UnicodeDecodeError, pd.errors.ParserError) as e:
+        return jsonify({'error': str(e)}), 400
+    logging.info(f'Uploaded file {file.filename} saved as upload {upload_id}')
+    return jsonify({'message': 'File uploaded successfully', 'uploadId': upload_id}), 200
+
+@bp.route('/generate_timetable', methods=['GET'])
 def generate_timetable():
     """Generate a timetable based on uploaded student data.
 
-    Loads student data from a CSV file and creates a timetable based on 
-    subject overlaps. Implements a greedy coloring algorithm for scheduling 
-    and generates a visual representation of the class network.
+    Creates a timetable for the upload given by `upload_id` based on
+    subject overlaps (see build_timetable). The class network parsed at
+    upload time is reused, so repeated calls with other rooms or slots do
+    not read the CSV again. With `async=1` the timetable is built as a
+    background job and its id is returned at once.
 
     Returns:
-        JSON response with a success message or an error message.
+        JSON response with the run id of the timetable or an error message.
     """
-    global uploaded_csv_path
-    if uploaded_csv_path == '':
+    try:
+        class_network = current_app.extensions['uploads'].network(request.args.get('upload_id'))
+    except KeyError:
         return jsonify({'error': 'No uploaded file found'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Retrieve the rooms from the request args: either a capacity per room or
+    # a number of rooms of room_capacity seats (default 1 room)
+    try:
+        capacities = parse_capacities(request.args.get('room_capacities'),
+                                      int(request.args.get('num_rooms', 1)),
+                                      int(request.args.get('room_capacity', DEFAULT_ROOM_CAPACITY)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Slots available (unlimited when not given), whether to minimise them
+    # further, and the scheduling engine: greedy colouring or CP-SAT
+    num_slots = request.args.get('num_slots', type=int)
+    improve = request.args.get('improve', 'false').lower() in ('1', 'true', 'yes')
+    engine = request.args.get('engine', 'greedy')
+    try:
+        time_limit = float(request.args.get('time_limit', DEFAULT_TIME_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'time_limit must be a number'}), 400
+    if not 0 < time_limit <= MAX_TIME_LIMIT:
+        return jsonify({'error': f'time_limit must be above 0 and at most {MAX_TIME_LIMIT} seconds'}), 400
+    if num_slots is not None and num_slots < 1:
+        return jsonify({'error': 'num_slots must be at least 1'}), 400
+    if engine not in ENGINES:
+        return jsonify({'error': f"engine must be one of: {', '.join(ENGINES)}"}), 400
+
+    runs = current_app.extensions['runs']
+    if request.args.get('async', 'false').lower() in ('1', 'true', 'yes'):
+        job = current_app.extensions['jobs'].submit(build_timetable, runs, class_network, capacities, num_slots,
+                                                    improve, engine, time_limit)
+        return jsonify({'jobId': job.id, 'statusUrl': f'/jobs/{job.id}'}), 202
+
+    return jsonify(build_timetable(runs, class_network, capacities, num_slots, improve, engine, time_limit)), 200
+
+def build_timetable(runs, class_network, capacities, num_slots=None, improve=False, engine='greedy',
+                    time_limit=DEFAULT_TIME_LIMIT, progress=None):
+    """Schedule the exams of the uploaded students into slots and rooms.
+
+    Colours the conflict graph with DSatur on integer slots, optionally
+    improved by tabu search, and with engine='cpsat' refines the colouring
+    with the CP-SAT solver within time_limit seconds. Courses that do not
+    fit in num_slots are reported as unscheduled. Every slot's exams are then
+    packed into the rooms, the timetable and a summary are saved under a new
+    run id and the class network image is queued for rendering.
+
+    Args:
+        runs (ArtifactStore): Where the run's files are written.
+        class_network (nx.Graph): The weighted class network of an upload.
+            It is copied, not modified.
+        capacities (list): Seats of each room.
+        num_slots (int, optional): Number of slots available.
+        improve (bool): Whether to minimise the slots with tabu search.
+        engine (str): 'greedy' or 'cpsat'.
+        time_limit (float): Seconds the CP-SAT solver may take.
+        progress (callable, optional): Called with the current stage and
+            the progress of the colouring and solver; may raise to stop.
 
-    # Load student data
-    student_data = pd.read_csv(uploaded_csv_path)
+    Returns:
+        dict: Summary of the generated timetable, with its run id.
+    """
+    report = progress or (lambda **progress: None)
+    class_network = class_network.copy()
+
+    report(stage='colouring')
+    with stage('colouring'):
+        slots, uncoloured = dsatur(class_network, num_slots)
+    if improve:
+        report(stage='improving')
+        with stage('improving'):
+            slots, uncoloured = improve_coloring(class_network, slots, uncoloured, num_slots, progress=progress)
+
+    solver_status = None
+    if engine == 'cpsat' and class_network.number_of_nodes():
+        # Seed CP-SAT with the colouring. Without a slot cap, allow the greedy
+        # slot count plus the slots needed to hold every student at once; the
+        # seat limit is only modelled when every exam fits in all rooms
+        report(stage='solving')
+        enrolments = dict(class_network.nodes(data='students'))
+        capacity = sum(capacities) if max(enrolments.values()) <= sum(capacities) else None
+        solver_slots = num_slots or max(slots.values()) + 1 + (
+            -(-sum(enrolments.values()) // capacity) if capacity else 0)
+        with stage('solving'):
+            solved, solver_status = solve_timetable(class_network, slots, solver_slots, capacity, time_limit,
+                                                    progress=progress)
+        if solved is not None:
+            slots, uncoloured = solved, []
+        else:
+            logging.warning(f'CP-SAT found no timetable ({solver_status}); keeping the greedy colouring')
+    if uncoloured:
+        logging.warning(f'{len(uncoloured)} course(s) do not fit in {num_slots} slots: {uncoloured}')
+
+    for course, data in class_network.nodes(data=True):
+        slot = slots.get(course)
+        data['slot'] = slot
+        data['color'] = UNSCHEDULED_COLOR if slot is None else SLOT_COLORS[slot % len(SLOT_COLORS)]
+
+    used_slots = max(slots.values()) + 1 if slots else 0
+    dates = slot_dates(used_slots)
+    calendar = {date: [] for date in dates}
+    for course, slot in slots.items():
+        calendar[dates[slot]].append(course)
+
+    # Seat every slot's exams in the rooms, splitting exams too large for one room
+    report(stage='packing')
+    enrolments = dict(class_network.nodes(data='students'))
+    with stage('packing'):
+        placements, unseated = pack_rooms(calendar, enrolments, capacities)
+    if unseated:
+        logging.warning(f'Not enough seats for {sum(unseated.values())} student(s): {unseated}')
+
+    # Create a DataFrame to hold the timetable: one row per slot, one column
+    # per room, each cell listing the exams held there with their students
+    report(stage='writing')
+    with stage('writing'):
+        rooms = ["Room " + str(i) for i in range(len(capacities))]
+        df = pd.DataFrame('', index=pd.Index(dates), columns=rooms)
+        for date, slot_placements in placements.items():
+            for room, course, students in slot_placements:
+                cell = df.at[date, rooms[room]]
+                df.at[date, rooms[room]] = f'{cell}; {course} ({students})' if cell else f'{course} ({students})'
+
+        # Save to CSV in this run's own directory
+        run_id = runs.create()
+        df.to_csv(runs.path(run_id, TIMETABLE_FILE))
+
+    # Generate class network image in the background, next to the timetable
+    graph_image_path = submit_network_image(class_network, runs.path(run_id, IMAGE_FILE))
+
+    with stage('back_to_back'):
+        back_to_back = back_to_back_students(class_network, slots)
+    summary = {'message': 'Timetable generated', 'runId': run_id, 'slots': used_slots,
+               'unscheduled': uncoloured, 'unseated': unseated,
+               'backToBack': back_to_back,
+               'engine': engine, 'solverStatus': solver_status,
+               'image': os.path.basename(graph_image_path)}
+    with open(runs.path(run_id, SUMMARY_FILE), 'w') as f:
+        json.dump(summary, f)
+    return summary
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report the state and progress of a background job.
 
-    # Check if 'uid' column exists
-    if 'uid' not in student_data.columns:
-        return jsonify({'error': "CSV file must contain a 'uid' column."}), 400
+    Returns:
+        JSON description of the job, or an error message if it is unknown.
+    """
+    job = current_app.extensions['jobs'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
 
-    student_data = student_data.set_index('uid')
+@bp.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Return the result of a finished timetable job.
 
-    # Retrieve the number of rooms from the request args
-    num_rooms = int(request.args.get('num_rooms', 1))  # Default to 1 if not provided
+    Returns:
+        JSON response as /generate_timetable, or an error message while the
+        job is not done.
+    """
+    job = current_app.extensions['jobs'].get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.state != 'done':
+        return jsonify({'error': f'Job is {job.state}', 'job': job.to_dict()}), 409
+    return jsonify(job.result), 200
 
-    courses = list(student_data.columns)
-    class_network = nx.Graph()
-    class_network.add_nodes_from(courses)
+@bp.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running job.
 
-    without_subj = student_data.T
-    
-    list_of_overlaps = []
-    name_list = without_subj.columns
-    for student in name_list:
-        list_of_overlaps.append(list(without_subj.loc[without_subj[student]].index))
-
-    for sublist in list_of_overlaps:
-        for pair in itertools.combinations(sublist, 2):
-            class_network.add_edge(pair[0], pair[1])
-
-    colors = ["lightcoral", "gray", "lightgray", "firebrick", "red", "chocolate", "darkorange", 
-              "moccasin", "gold", "yellow", "darkolivegreen", "chartreuse", "forestgreen", 
-              "lime", "mediumaquamarine", "turquoise", "teal", "cadetblue", "dodgerblue", 
-              "blue", "slateblue", "blueviolet", "magenta", "lightsteelblue"]
-    
-    def greedy_coloring_algorithm(network, colors):
-        """Apply a greedy coloring algorithm to the class network.
-
-        Assigns colors to nodes in the network such that no adjacent nodes share the same color.
-
-        Args:
-            network (nx.Graph): The class network graph.
-            colors (list): A list of colors to be used for coloring the graph.
-        """
-        nodes = list(network.nodes())
-        random.shuffle(nodes)
-        for node in nodes:
-            dict_neighbors = dict(network[node])
-            nodes_neighbors = list(dict_neighbors.keys())
-
-            forbidden_colors = []
-            for neighbor in nodes_neighbors:
-                if 'color' in network.nodes[neighbor]:  # Check if the 'color' attribute exists
-                    forbidden_color = network.nodes[neighbor]['color']
-                    forbidden_colors.append(forbidden_color)
-            for color in colors:
-                if color not in forbidden_colors:
-                    network.nodes[node]['color'] = color
-                    break
-
-    greedy_coloring_algorithm(class_network, colors)
-    
-    dates = []
-    calendar = {}
-    for i in range(14, 20):
-        for j in range(10, 18, 2):
-            date = datetime(2024, 5, i, j, 0)
-            dates.append(date)
-            calendar[date] = []
-
-    from_color_to_date = {col: dates[i] for i, col in enumerate(colors) if i < len(dates)}
-
-    for v, data in class_network.nodes(data=True):
-        color = data.get('color')
-        if color in from_color_to_date:
-            calendar[from_color_to_date[color]].append(v)
-
-    # Ensure that rooms do not exceed the specified number
-    rooms = ["Room " + str(i) for i in range(num_rooms)]
-    
-    # Create a DataFrame to hold the timetable
-    if len(calendar) > 0:
-        max_exams = len(max(list(calendar.values()), key=len))
-        df = pd.DataFrame.from_dict(calendar, orient='index', columns=rooms[:max_exams])
-    else:
-        df = pd.DataFrame(columns=rooms)
-
-    # Save to CSV
-    timetable_csv_path = 'timetable.csv'
-    df.to_csv(timetable_csv_path)
-
-    # Generate class network image
-    plt.figure(figsize=(10, 8))
-    pos = nx.spring_layout(class_network)
-    nx.draw(class_network, pos, with_labels=True, node_color=[data['color'] for _, data in class_network.nodes(data=True)])
-    plt.title('Class Network Graph')
-    graph_image_path = 'class_network.png'
-    plt.savefig(graph_image_path)
-    plt.close()
-
-    return jsonify({'message': 'Timetable generated'}), 200
-
-@app.route('/download_image', methods=['GET'])
+    Returns:
+        JSON description of the job, or an error message if it is unknown.
+    """
+    job = current_app.extensions['jobs'].cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 202
+
+def run_summary(run_id):
+    """Summary saved with a generated timetable; raises KeyError if unknown."""
+    with open(current_app.extensions['runs'].path(run_id, SUMMARY_FILE)) as f:
+        return json.load(f)
+
+@bp.route('/download_image', methods=['GET'])
 def download_image():
-    """Download the generated class network image.
+    """Download the class network image of the timetable given by `run_id`.
 
     Returns:
-        Image file as an attachment if it exists, otherwise returns an error message.
+        Image file as an attachment if it exists, a 202 message while it is
+        still being rendered, otherwise an error message.
     """
-    graph_image_path = 'class_network.png'
+    try:
+        run_id = request.args.get('run_id')
+        graph_image_path = current_app.extensions['runs'].path(run_id, run_summary(run_id)['image'])
+    except KeyError:
+        return jsonify({'error': 'Timetable not found'}), 404
+    if is_rendering(graph_image_path):
+        return jsonify({'message': 'Image is still being rendered'}), 202
     if not os.path.isfile(graph_image_path):
         logging.error(f"Image file not found: {graph_image_path}")
         return jsonify({'error': 'Image file not found'}), 404
     return send_file(graph_image_path, as_attachment=True)
 
-@app.route('/download_csv', methods=['GET'])
+@bp.route('/download_csv', methods=['GET'])
 def download_csv():
-    """Download the generated timetable CSV file.
+    """Download the timetable CSV file given by `run_id`.
 
     Returns:
         CSV file as an attachment if it exists, otherwise returns an error message.
     """
-    timetable_csv_path = 'timetable.csv'
+    try:
+        timetable_csv_path = current_app.extensions['runs'].path(request.args.get('run_id'), TIMETABLE_FILE)
+    except KeyError:
+        return jsonify({'error': 'Timetable not found'}), 404
     if not os.path.isfile(timetable_csv_path):
         logging.error(f"File not found: {timetable_csv_path}")
         return jsonify({'error': 'File not found'}), 404
-    return send_file(timetable_csv_path, as_attachment=True)
+    return send_file(timetable_csv_path, as_attachment=True, download_name=TIMETABLE_FILE)
+
+def create_app(config=None):
+    """Build the timetable app.
+
+    Settings are the defaults below, overridden by FLASK_* environment
+    variables (FLASK_WARM_UP=1, FLASK_UPLOAD_DIR=/data/uploads,
+    FLASK_PROFILING=1, ...) and then by config. Request and stage latencies
+    are served on /metrics. Uploaded student files with their parsed class networks,
+    and the files of every generated timetable, are kept in stores keyed by
+    id, so concurrent users and worker processes never share state;
+    background builds started with async=1 run on the app's own JobManager.
+    Serve with e.g. gunicorn --preload 'app:create_app()'.
+
+    Args:
+        config (dict, optional): Settings overriding the defaults and the
+            environment.
+
+    Returns:
+        Flask: The configured app.
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(WARM_UP=False, UPLOAD_DIR=UPLOAD_DIR, ARTIFACT_DIR=ARTIFACT_DIR,
+                            JOB_WORKERS=DEFAULT_JOB_WORKERS, JOB_TTL=DEFAULT_JOB_TTL)
+    app.config.from_prefixed_env()
+    app.config.from_mapping(config or {})
+
+    # Relative directories are inside the app directory, whatever the working
+    # directory, so send_file finds the files of a run
+    upload_dir = os.path.join(app.root_path, app.config['UPLOAD_DIR'])
+    artifact_dir = os.path.join(app.root_path, app.config['ARTIFACT_DIR'])
+    os.makedirs(upload_dir, exist_ok=True)
+    os.makedirs(artifact_dir, exist_ok=True)
+    app.extensions['uploads'] = UploadStore(upload_dir)
+    app.extensions['runs'] = ArtifactStore(artifact_dir, ARTIFACT_TTL, MAX_ARTIFACTS)
+    app.extensions['jobs'] = JobManager(app.config['JOB_WORKERS'], app.config['JOB_TTL'])
+    app.register_blueprint(bp)
+    init_metrics(app)
+    if app.config['WARM_UP']:
+        warm_up()
+    return app
+
+def warm_up():
+    """Load the libraries a first timetable needs and run a tiny one.
+
+    networkx, scipy.sparse, OR-Tools and matplotlib are otherwise imported
+    by the first upload, solve or image. The conflict graph, colouring and
+    room packing run on three courses; the CP-SAT model is built but not
+    solved, so no solver threads are started. Meant to run before workers
+    fork (gunicorn --preload) so they share the pages.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from ortools.sat.python import cp_model
+
+    FigureCanvasAgg(Figure())
+    cp_model.CpModel().NewIntVar(0, 1, 'warm_up')
+    student_data = pd.DataFrame({'A': [True, True, False], 'B': [True, False, True], 'C': [False, True, True]})
+    network = conflict_graph(student_data)
+    slots, uncoloured = dsatur(network)
+    improve_coloring(network, slots, uncoloured, max_iterations=10)
+    dates = slot_dates(max(slots.values()) + 1)
+    calendar = {date: [] for date in dates}
+    for course, slot in slots.items():
+        calendar[dates[slot]].append(course)
+    pack_rooms(calendar, dict(network.nodes(data='students')), [DEFAULT_ROOM_CAPACITY])
 
 if __name__ == '__main__':
-    os.makedirs('uploads', exist_ok=True)   
-    app.run(debug=True)
+    create_app().run(debug=True)
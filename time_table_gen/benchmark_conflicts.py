@@ -0,0 +1,55 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import networkx as nx
+
+# The enrolment generator of data/data_gen.py, shared with benchmarks/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+from conflicts import conflict_graph
+from data_gen import enrolment_table
+
+def pairwise_graph(student_data):
+    """Class network built pair by pair, as generate_timetable used to."""
+    class_network = nx.Graph()
+    class_network.add_nodes_from(student_data.columns)
+    without_subj = student_data.T
+    for student in without_subj.columns:
+        for pair in itertools.combinations(without_subj.loc[without_subj[student]].index, 2):
+            class_network.add_edge(pair[0], pair[1])
+    return class_network
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare sparse and pairwise conflict graph construction.')
+    parser.add_argument('--sizes', type=str, nargs='+', default=['1000x100', '5000x500', '30000x2000'],
+                        help='students x courses')
+    parser.add_argument('--per-student', type=int, default=6)
+    parser.add_argument('--pairwise-limit', type=int, default=5000,
+                        help='largest student count also run through the pairwise builder')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'students x courses':>20} {'pairwise (s)':>13} {'sparse (s)':>11} {'edges':>9}")
+    for size in args.sizes:
+        students, courses = (int(part) for part in size.split('x'))
+        student_data = enrolment_table(students, courses, args.per_student, args.seed)
+
+        start = time.perf_counter()
+        network = conflict_graph(student_data)
+        sparse_time = time.perf_counter() - start
+
+        pairwise_time = float('nan')
+        if students <= args.pairwise_limit:
+            start = time.perf_counter()
+            expected = pairwise_graph(student_data)
+            pairwise_time = time.perf_counter() - start
+            if set(map(frozenset, expected.edges())) != set(map(frozenset, network.edges())):
+                raise SystemExit(f'{size}: edge sets differ')
+
+        print(f'{size:>20} {pairwise_time:>13.3f} {sparse_time:>11.3f} {network.number_of_edges():>9}')
+
+if __name__ == '__main__':
+    main()
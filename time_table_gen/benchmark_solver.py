@@ -0,0 +1,47 @@
+import argparse
+import os
+import sys
+import time
+
+# The enrolment generator of data/data_gen.py, shared with benchmarks/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+from coloring import dsatur, improve_coloring
+from conflicts import conflict_graph
+from data_gen import enrolment_table
+from solver import back_to_back_students, solve_timetable
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare greedy colouring and CP-SAT exam scheduling.')
+    parser.add_argument('--sizes', type=str, nargs='+', default=['500x30', '2000x80', '5000x200'],
+                        help='students x courses')
+    parser.add_argument('--per-student', type=int, default=5)
+    parser.add_argument('--time-limit', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'students x courses':>20} {'engine':>12} {'slots':>6} {'back-to-back':>13} {'time (s)':>9}  status")
+    for size in args.sizes:
+        students, courses = (int(part) for part in size.split('x'))
+        network = conflict_graph(enrolment_table(students, courses, args.per_student, args.seed))
+
+        start = time.perf_counter()
+        greedy, _ = dsatur(network)
+        runs = [('dsatur', greedy, time.perf_counter() - start, '')]
+
+        start = time.perf_counter()
+        improved, _ = improve_coloring(network, greedy)
+        runs.append(('dsatur+tabu', improved, time.perf_counter() - start, ''))
+
+        start = time.perf_counter()
+        solved, status = solve_timetable(network, improved, max(improved.values()) + 1,
+                                         time_limit=args.time_limit, workers=args.workers)
+        runs.append(('cpsat', solved or improved, time.perf_counter() - start, status))
+
+        for engine, slots, seconds, status in runs:
+            print(f'{size:>20} {engine:>12} {max(slots.values()) + 1:>6} '
+                  f'{back_to_back_students(network, slots):>13} {seconds:>9.2f}  {status}')
+
+if __name__ == '__main__':
+    main()
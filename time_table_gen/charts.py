@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+
+from common.metrics import stage
+
+# matplotlib is only used through the Agg canvas; forcing the backend also
+# keeps the pyplot import inside nx.draw from picking an interactive one
+os.environ['MPLBACKEND'] = 'Agg'
+
+# Images rendered at the same time
+CHART_WORKERS = 2
+
+_pool = ThreadPoolExecutor(max_workers=CHART_WORKERS, thread_name_prefix='chart')
+_pending = {}
+_pending_lock = threading.RLock()  # re-entered when a callback runs at once
+
+def _render(path, network):
+    """Draw the class network with the object-oriented matplotlib API.
+
+    Each call has its own Figure on an Agg canvas, so worker threads never
+    share pyplot state, and matplotlib and networkx are only imported on
+    first use. The layout is seeded so that the same graph always gives the
+    same picture.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    import networkx as nx
+
+    with stage('network_image'):
+        fig = Figure(figsize=(10, 8))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        pos = nx.spring_layout(network, seed=0)
+        nx.draw(network, pos, ax=ax, with_labels=True,
+                node_color=[data.get('color', 'lightgray') for _, data in network.nodes(data=True)])
+        ax.set_title('Class Network Graph')
+
+        # Write under a temporary name so a half-written PNG is never served
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        fig.savefig(temporary, format='png')
+        os.replace(temporary, path)
+
+def _finished(path, future):
+    with _pending_lock:
+        _pending.pop(path, None)
+    if future.exception() is not None:
+        logging.error(f'Could not render image {path}: {future.exception()}')
+
+def submit_network_image(network, path):
+    """Queue the class network image of a run and return its path at once.
+
+    Nothing is drawn when the image already exists or is being drawn.
+
+    Args:
+        network (nx.Graph): The colored class network graph. It must not be
+            modified afterwards.
+        path (str): Where to write the image, inside the run's directory so
+            that it is evicted with the run.
+
+    Returns:
+        str: Path the image is (or will be) written to.
+    """
+    with _pending_lock:
+        if path not in _pending and not os.path.isfile(path):
+            future = _pool.submit(_render, path, network)
+            _pending[path] = future
+            future.add_done_callback(lambda future: _finished(path, future))
+    return path
+
+def is_rendering(path):
+    """Whether the image at path is still queued or being drawn."""
+    with _pending_lock:
+        return path in _pending
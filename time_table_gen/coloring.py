@@ -0,0 +1,188 @@
+from datetime import datetime, timedelta
+import heapq
+import random
+
+import numpy as np
+
+# First exam slot and the spacing of slots: four two-hour slots a day
+FIRST_SLOT = datetime(2024, 5, 14, 10, 0)
+SLOTS_PER_DAY = 4
+SLOT_LENGTH = timedelta(hours=2)
+
+# Tabu search defaults for improve_coloring
+DEFAULT_TABU_ITERATIONS = 10000
+TABU_TENURE = 10
+
+# Tabu moves between two progress reports
+PROGRESS_INTERVAL = 1000
+
+def _adjacency(network):
+    """Courses in graph order and the neighbour indices of each course."""
+    courses = list(network.nodes())
+    index = {course: i for i, course in enumerate(courses)}
+    adjacency = [[index[neighbor] for neighbor in network[course]] for course in courses]
+    return courses, adjacency
+
+def dsatur(network, num_slots=None):
+    """Colour the class network with DSatur on integer slot ids.
+
+    The next course is always the one with the most distinct slots among its
+    neighbours (its saturation), ties broken by degree and then by graph
+    order, so the result is deterministic. Candidates live in a heap with
+    lazy invalidation: a course is pushed again whenever its saturation
+    grows, and stale entries are skipped when popped.
+
+    Args:
+        network (nx.Graph): The class network graph.
+        num_slots (int, optional): Number of slots available. Courses with
+            every slot taken by a neighbour are left uncoloured. Unlimited
+            when None.
+
+    Returns:
+        tuple: (slots, uncoloured) where slots maps each coloured course to
+        its slot id and uncoloured lists the courses that did not fit.
+    """
+    courses, adjacency = _adjacency(network)
+    slot_of = [-1] * len(courses)
+    neighbor_slots = [set() for _ in courses]
+    uncoloured = []
+
+    heap = [(0, -len(neighbors), i) for i, neighbors in enumerate(adjacency)]
+    heapq.heapify(heap)
+    done = [False] * len(courses)
+    while heap:
+        saturation, _, v = heapq.heappop(heap)
+        if done[v] or -saturation != len(neighbor_slots[v]):
+            continue
+        done[v] = True
+
+        slot = 0
+        while slot in neighbor_slots[v]:
+            slot += 1
+        if num_slots is not None and slot >= num_slots:
+            uncoloured.append(courses[v])
+            continue
+
+        slot_of[v] = slot
+        for u in adjacency[v]:
+            if not done[u] and slot not in neighbor_slots[u]:
+                neighbor_slots[u].add(slot)
+                heapq.heappush(heap, (-len(neighbor_slots[u]), -len(adjacency[u]), u))
+
+    slots = {course: slot for course, slot in zip(courses, slot_of) if slot >= 0}
+    return slots, uncoloured
+
+def _tabucol(adjacency, colors, k, max_iterations, rng, progress=None):
+    """Search for a conflict-free k-colouring with TabuCol.
+
+    Each step moves one conflicting course to the slot that lowers the number
+    of conflicting edges the most, forbidding the move back for a while;
+    tabu moves are still taken when they beat the best colouring seen.
+
+    Returns:
+        tuple: (colors, iterations used), colors being None when no
+        conflict-free colouring was found within max_iterations.
+    """
+    n = len(adjacency)
+    colors = np.array(colors)
+    gamma = np.zeros((n, k), dtype=np.int64)  # neighbours of each course in each slot
+    for v, neighbors in enumerate(adjacency):
+        np.add.at(gamma[v], colors[neighbors], 1)
+    rows = np.arange(n)
+    conflicts = int(gamma[rows, colors].sum()) // 2
+    best = conflicts
+    tabu = np.zeros((n, k), dtype=np.int64)
+
+    for iteration in range(max_iterations):
+        if conflicts == 0:
+            return colors.tolist(), iteration
+        if progress is not None and iteration % PROGRESS_INTERVAL == 0:
+            progress(tabu_slots=k, tabu_iteration=iteration, conflicts=conflicts)
+        conflicting = np.flatnonzero(gamma[rows, colors] > 0)
+        deltas = gamma[conflicting] - gamma[conflicting, colors[conflicting]][:, None]
+        deltas[np.arange(len(conflicting)), colors[conflicting]] = n * n  # staying put is not a move
+        allowed = (tabu[conflicting] <= iteration) | (conflicts + deltas < best)
+        deltas = np.where(allowed, deltas, n * n)
+
+        candidates = np.argwhere(deltas == deltas.min())
+        row, new = candidates[rng.randrange(len(candidates))]
+        if deltas[row, new] >= n * n:
+            continue
+        v = conflicting[row]
+        old = colors[v]
+
+        colors[v] = new
+        neighbors = adjacency[v]
+        np.subtract.at(gamma[:, old], neighbors, 1)
+        np.add.at(gamma[:, new], neighbors, 1)
+        tabu[v, old] = iteration + TABU_TENURE + rng.randrange(len(conflicting) + 1)
+        conflicts += int(deltas[row, new])
+        best = min(best, conflicts)
+
+    return (colors.tolist() if conflicts == 0 else None), max_iterations
+
+def improve_coloring(network, slots, uncoloured=(), num_slots=None,
+                     max_iterations=DEFAULT_TABU_ITERATIONS, seed=0, progress=None):
+    """Iterated improvement of a colouring with tabu search.
+
+    Uncoloured courses are first fitted into the num_slots available; then
+    the highest slot is emptied again and again, re-colouring the graph
+    with one slot fewer, until the search fails or the iteration budget
+    shared by all attempts runs out.
+
+    Args:
+        network (nx.Graph): The class network graph.
+        slots (dict): Course to slot id, as returned by dsatur.
+        uncoloured (list): Courses that did not fit in num_slots.
+        num_slots (int, optional): Number of slots available.
+        max_iterations (int): Tabu moves allowed in total.
+        seed (int): Seed of the tie-breaking random generator.
+        progress (callable, optional): Called with the slot count being
+            tried, the tabu iteration and the conflicts left; may raise to
+            stop the search.
+
+    Returns:
+        tuple: (slots, uncoloured) as dsatur, never worse than the input.
+    """
+    courses, adjacency = _adjacency(network)
+    if not courses:
+        return dict(slots), list(uncoloured)
+    rng = random.Random(seed)
+    budget = max_iterations
+
+    def start_from(colors, k):
+        # Courses outside the first k slots go to their least conflicting slot
+        start = list(colors)
+        for v, color in enumerate(start):
+            if color < 0 or color >= k:
+                used = [0] * k
+                for u in adjacency[v]:
+                    if 0 <= start[u] < k:
+                        used[start[u]] += 1
+                start[v] = min(range(k), key=used.__getitem__)
+        return start
+
+    colors = [slots.get(course, -1) for course in courses]
+    if uncoloured and num_slots:
+        found, used = _tabucol(adjacency, start_from(colors, num_slots), num_slots, budget, rng, progress)
+        budget -= used
+        if found is None:
+            return dict(slots), list(uncoloured)
+        colors = found
+
+    while budget > 0:
+        k = max(colors) + 1
+        if k <= 1:
+            break
+        found, used = _tabucol(adjacency, start_from(colors, k - 1), k - 1, budget, rng, progress)
+        budget -= used
+        if found is None:
+            break
+        colors = found
+
+    return {course: color for course, color in zip(courses, colors)}, []
+
+def slot_dates(num_slots):
+    """Start time of each slot, SLOTS_PER_DAY slots a day from FIRST_SLOT."""
+    return [FIRST_SLOT + timedelta(days=slot // SLOTS_PER_DAY) + (slot % SLOTS_PER_DAY) * SLOT_LENGTH
+            for slot in range(num_slots)]
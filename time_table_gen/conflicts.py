@@ -0,0 +1,69 @@
+import numpy as np
+
+# networkx and scipy.sparse are imported on first use, keeping them out of
+# the start-up of the web app
+
+def enrolment_matrix(student_data):
+    """Sparse students x courses enrolment matrix.
+
+    Args:
+        student_data (pd.DataFrame): One row per student and one boolean
+            column per course, True when the student takes the course.
+
+    Returns:
+        sparse.csr_matrix: int32 matrix with a 1 for every enrolment.
+    """
+    from scipy import sparse
+
+    enrolled = student_data.fillna(False).to_numpy(dtype=bool)
+    return sparse.csr_matrix(enrolled, dtype=np.int32)
+
+def conflict_matrix(enrolment):
+    """Course overlap counts from one sparse product.
+
+    Entry (i, j) of E.T @ E is the number of students taking both course i
+    and course j. Only the upper triangle without the diagonal is kept, so
+    every conflicting pair appears once. The diagonal, the enrolment of each
+    course, is returned separately.
+
+    Args:
+        enrolment (sparse matrix): Students x courses enrolment matrix.
+
+    Returns:
+        tuple: (conflicts, enrolments) where conflicts is a sparse.coo_matrix
+        of courses x courses overlap counts with i < j and enrolments is the
+        number of students of each course.
+    """
+    from scipy import sparse
+
+    enrolment = sparse.csc_matrix(enrolment)
+    overlaps = (enrolment.T @ enrolment).tocoo()
+    upper = overlaps.row < overlaps.col
+    conflicts = sparse.coo_matrix((overlaps.data[upper], (overlaps.row[upper], overlaps.col[upper])),
+                                  shape=overlaps.shape)
+    return conflicts, overlaps.diagonal()
+
+def conflict_graph(student_data):
+    """Build the class network of courses that share at least one student.
+
+    Every course is a node; two courses are joined when some student takes
+    both, with the number of such students as the edge 'weight'. Each node
+    has its enrolment as the 'students' attribute.
+
+    Args:
+        student_data (pd.DataFrame): One row per student and one boolean
+            column per course.
+
+    Returns:
+        nx.Graph: The weighted class network graph.
+    """
+    import networkx as nx
+
+    courses = list(student_data.columns)
+    conflicts, enrolments = conflict_matrix(enrolment_matrix(student_data))
+
+    network = nx.Graph()
+    network.add_nodes_from((course, {'students': int(students)}) for course, students in zip(courses, enrolments))
+    network.add_weighted_edges_from(
+        (courses[i], courses[j], int(weight)) for i, j, weight in zip(conflicts.row, conflicts.col, conflicts.data))
+    return network
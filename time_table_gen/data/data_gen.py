@@ -1,36 +1,118 @@
+import argparse
+import os
+import sys
+
+import numpy as np
 import pandas as pd
-import random
 
-# Define the number of students and courses
-num_students = 200  # Number of students
-courses = [
+# Modules shared by every app live in common/ at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from common.chunks import write_chunks
+
+# Course names used first; larger catalogues continue with C12, C13, ...
+COURSES = [
     'CC', 'ADV', 'CSD', 'CE', 'AIH', 'RMV', 'BCT', 'SMA', 'DL', 'CA', 'RS', 'CSS'
 ]
 
-# Generate student IDs
-student_ids = [f'202130{str(i).zfill(4)}' for i in range(num_students)]
+# Student ids are this prefix followed by a zero-padded index
+UID_PREFIX = 202130
+
+# Rows per chunk, further capped so one chunk holds at most CHUNK_CELLS
+# student x course scores
+DEFAULT_CHUNK_SIZE = 1000000
+CHUNK_CELLS = 2 ** 24
+
+def course_names(num_courses):
+    """The first num_courses names of COURSES, extended with C<i>."""
+    return COURSES[:num_courses] + [f'C{i}' for i in range(len(COURSES), num_courses)]
+
+def generate_enrolments(num_students, num_courses=len(COURSES), courses_per_student=6, skew=0.0,
+                        programmes=4, correlation=4.0, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Generate the student x course enrolment table in chunks.
+
+    Each student belongs to one of several programmes. A programme favours a
+    random core of courses, whose weight is multiplied by correlation, so
+    students of the same programme share courses and the conflict graph has
+    the clustered structure of a real timetable. Course popularity follows
+    rank ** -skew. Every student takes a Poisson number of courses (at least
+    one), drawn without replacement in proportion to the weights with the
+    Gumbel top-k trick, so no per-row Python loop is needed.
+
+    Args:
+        num_students (int): Number of students (rows).
+        num_courses (int): Number of courses (boolean columns).
+        courses_per_student (float): Mean courses taken per student.
+        skew (float): Course popularity skew, 0 for uniform.
+        programmes (int): Number of programmes.
+        correlation (float): Weight multiplier of a programme's core
+            courses; 1 makes enrolments independent.
+        seed (int, optional): Seed of the random generator.
+        chunk_size (int): Rows per yielded DataFrame.
+
+    Yields:
+        pd.DataFrame: A 'uid' column followed by one boolean column per course.
+    """
+    rng = np.random.default_rng(seed)
+    courses = course_names(num_courses)
+    popularity = np.arange(1, num_courses + 1, dtype=float) ** -skew
+    affinity = np.ones((programmes, num_courses))
+    core_size = max(1, min(num_courses, round(courses_per_student)))
+    for programme in range(programmes):
+        affinity[programme, rng.choice(num_courses, core_size, replace=False)] = correlation
+    log_weights = np.log(popularity[rng.permutation(num_courses)] * affinity)
+
+    width = max(4, len(str(num_students - 1)))
+    chunk_size = max(1, min(chunk_size, CHUNK_CELLS // num_courses))
+    for start in range(0, num_students, chunk_size):
+        size = min(chunk_size, num_students - start)
+        programme = rng.integers(programmes, size=size)
+        taken = np.clip(rng.poisson(courses_per_student, size), 1, num_courses)
+        scores = log_weights[programme] + rng.gumbel(size=(size, num_courses))
+        cutoff = -np.sort(-scores, axis=1)[np.arange(size), taken - 1]
+        enrolled = pd.DataFrame(scores >= cutoff[:, None], columns=courses)
+        enrolled.insert(0, 'uid', UID_PREFIX * 10 ** width + np.arange(start, start + size, dtype=np.int64))
+        yield enrolled
+
+def enrolment_table(num_students, num_courses=len(COURSES), courses_per_student=6, seed=None, **options):
+    """The whole enrolment table of generate_enrolments in one DataFrame.
 
-# Create an empty DataFrame to hold student enrollments with 'uid' as the first column
-student_data = pd.DataFrame(index=student_ids, columns=courses)
-student_data.reset_index(inplace=True)
-student_data.rename(columns={'index': 'uid'}, inplace=True)
+    The seeded generator used by the benchmarks as well, so every workload
+    has the same programme structure as the generated datasets.
 
-# Randomly assign enrollment status
-for course in courses:
-    student_data[course] = [random.choice([True, False]) for _ in range(num_students)]
+    Args:
+        num_students (int): Number of students (rows).
+        num_courses (int): Number of courses (boolean columns).
+        courses_per_student (float): Mean courses taken per student.
+        seed (int, optional): Seed of the random generator.
+        **options: Further arguments of generate_enrolments.
 
-# Optionally, ensure that some courses are more popular
-# For example, we can enforce a minimum number of students enrolled in each course
-for course in courses:
-    # Randomly select a few students to ensure they are enrolled in this course
-    students_to_enroll = random.sample(student_ids, k=random.randint(20, 50))  # 20 to 50 students
-    for student in students_to_enroll:
-        student_data.loc[student_data['uid'] == student, course] = True
+    Returns:
+        pd.DataFrame: One boolean column per course, indexed by 'uid'.
+    """
+    chunks = generate_enrolments(num_students, num_courses, courses_per_student, seed=seed, **options)
+    return pd.concat(chunks, ignore_index=True).set_index('uid')
 
-# Fill any remaining NaNs with False (indicating not enrolled)
-student_data.fillna(False, inplace=True)
+def main():
+    parser = argparse.ArgumentParser(description='Generate a student x course enrolment table.')
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--courses', type=int, default=len(COURSES), help='number of courses')
+    parser.add_argument('--courses-per-student', type=float, default=6)
+    parser.add_argument('--skew', type=float, default=0.0, help='course popularity skew, 0 for uniform')
+    parser.add_argument('--programmes', type=int, default=4)
+    parser.add_argument('--correlation', type=float, default=4.0,
+                        help='weight of a programme\'s core courses; 1 for independent enrolments')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=None,
+                        help='output format; inferred from the file name by default')
+    parser.add_argument('--output', default='courses.csv')
+    args = parser.parse_args()
 
-# Save the DataFrame to a CSV file
-student_data.to_csv('courses.csv', index=False)
+    chunks = generate_enrolments(args.students, args.courses, args.courses_per_student, args.skew,
+                                 args.programmes, args.correlation, args.seed, args.chunk_size)
+    rows = write_chunks(chunks, args.output, args.format)
+    print(f"Dataset of {rows} students created and saved as '{args.output}'.")
 
-print("Dataset created and saved as 'courses.csv'.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
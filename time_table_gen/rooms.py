@@ -0,0 +1,145 @@
+import bisect
+
+# Seats per room when only a number of rooms is given
+DEFAULT_ROOM_CAPACITY = 60
+
+# Slots with at most this many exams get an exact search for a split-free
+# packing when the heuristic had to split, bounded by EXACT_NODE_LIMIT steps
+EXACT_EXAM_LIMIT = 10
+EXACT_NODE_LIMIT = 100000
+
+def parse_capacities(room_capacities=None, num_rooms=1, room_capacity=DEFAULT_ROOM_CAPACITY):
+    """Room capacities from a request.
+
+    Args:
+        room_capacities (str, optional): Comma-separated seats per room,
+            e.g. "60,60,40". Takes precedence over num_rooms.
+        num_rooms (int): Number of rooms of room_capacity seats each.
+        room_capacity (int): Seats per room when room_capacities is not given.
+
+    Returns:
+        list: Seats of each room.
+
+    Raises:
+        ValueError: If no rooms are given or a capacity is not positive.
+    """
+    if room_capacities:
+        capacities = [int(seats) for seats in room_capacities.split(',')]
+    else:
+        capacities = [room_capacity] * num_rooms
+    if not capacities or min(capacities) < 1:
+        raise ValueError('At least one room with a positive capacity is required')
+    return capacities
+
+def _best_fit(exams, capacities):
+    """Best-fit decreasing with splitting.
+
+    Exams are placed largest first in the room whose free seats fit them
+    most tightly. An exam that fits in no single room is spread over the
+    rooms with the most free seats, largest first, so it uses as few rooms as
+    possible. Free seats are kept in a sorted list searched by bisection.
+
+    Returns:
+        tuple: (placements, unseated) with placements a list of
+        (room, course, students) and unseated a dict of students per course
+        that did not fit anywhere.
+    """
+    free = sorted((seats, room) for room, seats in enumerate(capacities))
+    placements = []
+    unseated = {}
+    for course, students in sorted(exams, key=lambda exam: -exam[1]):
+        position = bisect.bisect_left(free, (students, -1))
+        if position < len(free):
+            seats, room = free.pop(position)
+            placements.append((room, course, students))
+            if seats > students:
+                bisect.insort(free, (seats - students, room))
+            continue
+
+        while students and free:
+            seats, room = free.pop()
+            taken = min(seats, students)
+            placements.append((room, course, taken))
+            students -= taken
+            if seats > taken:
+                bisect.insort(free, (seats - taken, room))
+        if students:
+            unseated[course] = students
+    return placements, unseated
+
+def _exact(exams, capacities):
+    """Depth-first search for a packing where no exam is split.
+
+    Rooms with equal free seats are interchangeable, so only one of them is
+    tried for each exam. Returns the placements, or None when there is no
+    such packing or the search exceeds EXACT_NODE_LIMIT steps.
+    """
+    exams = sorted(exams, key=lambda exam: -exam[1])
+    free = list(capacities)
+    chosen = [None] * len(exams)
+    nodes = 0
+
+    def place(i):
+        nonlocal nodes
+        if i == len(exams):
+            return True
+        nodes += 1
+        if nodes > EXACT_NODE_LIMIT:
+            return False
+        tried = set()
+        for room in sorted(range(len(free)), key=free.__getitem__):
+            seats = free[room]
+            if seats < exams[i][1] or seats in tried:
+                continue
+            tried.add(seats)
+            free[room] -= exams[i][1]
+            chosen[i] = room
+            if place(i + 1):
+                return True
+            free[room] += exams[i][1]
+        return False
+
+    if sum(students for _, students in exams) > sum(capacities) or not place(0):
+        return None
+    return [(room, course, students) for room, (course, students) in zip(chosen, exams)]
+
+def pack_slot(exams, capacities):
+    """Assign the exams of one slot to rooms.
+
+    Args:
+        exams (list): (course, students) pairs held in the slot.
+        capacities (list): Seats of each room.
+
+    Returns:
+        tuple: (placements, unseated) where placements lists
+        (room index, course, students) and unseated maps courses to the
+        number of their students that could not be seated.
+    """
+    placements, unseated = _best_fit(exams, capacities)
+    split = len(placements) > len(exams) - len(unseated)
+    if split and not unseated and len(exams) <= EXACT_EXAM_LIMIT:
+        exact = _exact(exams, capacities)
+        if exact is not None:
+            return exact, {}
+    return placements, unseated
+
+def pack_rooms(calendar, enrolments, capacities):
+    """Pack the exams of every slot into rooms.
+
+    Args:
+        calendar (dict): Slot date to the courses examined in that slot.
+        enrolments (dict): Number of students of each course.
+        capacities (list): Seats of each room.
+
+    Returns:
+        tuple: (rooms, unseated) where rooms maps each date to a list of
+        (room index, course, students) and unseated maps courses to the
+        number of their students left without a seat.
+    """
+    rooms = {}
+    unseated = {}
+    for date, courses in calendar.items():
+        placements, missing = pack_slot([(course, enrolments.get(course, 0)) for course in courses], capacities)
+        rooms[date] = sorted(placements)
+        unseated.update(missing)
+    return rooms, unseated
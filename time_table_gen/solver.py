@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+
+from coloring import SLOTS_PER_DAY
+
+# Default and largest solver time limit, in seconds
+DEFAULT_TIME_LIMIT = 10
+MAX_TIME_LIMIT = 120
+
+# The back-to-back objective adds a few variables per conflicting pair of
+# courses; above this many pairs only the number of slots is minimised
+BACK_TO_BACK_EDGE_LIMIT = 20000
+
+# Seconds between two progress reports while the solver runs
+PROGRESS_INTERVAL = 0.5
+
+def _solution_counter():
+    """A CP-SAT callback keeping the number of solutions found and the latest objective.
+
+    The class is defined here because OR-Tools, slow to import, is only
+    loaded once a timetable is actually solved.
+    """
+    from ortools.sat.python import cp_model
+
+    class SolutionCounter(cp_model.CpSolverSolutionCallback):
+        def __init__(self):
+            cp_model.CpSolverSolutionCallback.__init__(self)
+            self.solutions = 0
+            self.objective = None
+
+        def on_solution_callback(self):
+            self.solutions += 1
+            self.objective = self.ObjectiveValue()
+
+    return SolutionCounter()
+
+def back_to_back_students(network, slots):
+    """Students with two exams in consecutive slots of the same day.
+
+    Counted per conflicting pair of courses with the pair's shared students
+    (the edge 'weight'), so a student with three exams in a row counts twice.
+
+    Args:
+        network (nx.Graph): The weighted class network graph.
+        slots (dict): Course to slot id.
+
+    Returns:
+        int: Number of back-to-back exam pairs over all students.
+    """
+    total = 0
+    for u, v, weight in network.edges(data='weight', default=1):
+        if u in slots and v in slots and abs(slots[u] - slots[v]) == 1 \
+                and slots[u] // SLOTS_PER_DAY == slots[v] // SLOTS_PER_DAY:
+            total += weight
+    return total
+
+def solve_timetable(network, hint, num_slots, capacity=None, time_limit=DEFAULT_TIME_LIMIT, workers=None,
+                    progress=None):
+    """Schedule exams with CP-SAT.
+
+    Every course gets a slot in [0, num_slots); courses sharing a student
+    get different slots, and when a total room capacity is given the
+    students examined in a slot must fit in it. The objective minimises the
+    number of slots used first and then the number of back-to-back exams.
+    The search starts from the hint and returns the best solution found
+    within the time limit.
+
+    Args:
+        network (nx.Graph): The weighted class network graph, with the
+            'students' of each course as a node attribute.
+        hint (dict): Course to slot id of a known (possibly partial)
+            colouring, e.g. from dsatur.
+        num_slots (int): Number of slots available.
+        capacity (int, optional): Seats over all rooms.
+        time_limit (float): Seconds the search may take.
+        workers (int, optional): Search workers; all cores when None.
+        progress (callable, optional): Called every PROGRESS_INTERVAL seconds
+            from a watcher thread with the elapsed time, solutions found and
+            latest objective. If it raises, the search is stopped and the
+            exception re-raised.
+
+    Returns:
+        tuple: (slots, status) with slots mapping every course to its slot,
+        and status the solver status name. When the solver finds nothing
+        better, a hint covering every course is returned as is; without one,
+        slots is None when no solution was found.
+    """
+    from ortools.sat.python import cp_model
+
+    courses = list(network.nodes())
+    model = cp_model.CpModel()
+    slot = {course: model.NewIntVar(0, num_slots - 1, f'slot_{i}') for i, course in enumerate(courses)}
+
+    # A hint covering every course is extended to all auxiliary variables,
+    # so the solver starts from a complete solution
+    complete = all(0 <= hint.get(course, -1) < num_slots for course in courses)
+    hints = []
+
+    def hinted(variable, value):
+        if complete:
+            hints.append((variable, int(value)))
+        return variable
+
+    for course in courses:
+        if 0 <= hint.get(course, -1) < num_slots:
+            model.AddHint(slot[course], hint[course])
+
+    for u, v in network.edges():
+        model.Add(slot[u] != slot[v])
+
+    if capacity is not None:
+        for s in range(num_slots):
+            held = []
+            for course in courses:
+                is_held = hinted(model.NewBoolVar(''), hint.get(course) == s)
+                model.Add(slot[course] == s).OnlyEnforceIf(is_held)
+                model.Add(slot[course] != s).OnlyEnforceIf(is_held.Not())
+                held.append(network.nodes[course].get('students', 0) * is_held)
+            model.Add(sum(held) <= capacity)
+
+    used_slots = model.NewIntVar(1 if courses else 0, num_slots, 'used_slots')
+    model.AddMaxEquality(used_slots, [slot[course] + 1 for course in courses] or [0])
+    if complete and courses:
+        hinted(used_slots, max(hint[course] for course in courses) + 1)
+
+    back_to_back = []
+    if network.number_of_edges() <= BACK_TO_BACK_EDGE_LIMIT:
+        day = {}
+        for course in courses:
+            day[course] = model.NewIntVar(0, (num_slots - 1) // SLOTS_PER_DAY, '')
+            model.AddDivisionEquality(day[course], slot[course], SLOTS_PER_DAY)
+            if complete:
+                hinted(day[course], hint[course] // SLOTS_PER_DAY)
+        for u, v, weight in network.edges(data='weight', default=1):
+            gap_value = abs(hint[u] - hint[v]) if complete else 0
+            same_day_value = complete and hint[u] // SLOTS_PER_DAY == hint[v] // SLOTS_PER_DAY
+            gap = hinted(model.NewIntVar(0, num_slots - 1, ''), gap_value)
+            model.AddAbsEquality(gap, slot[u] - slot[v])
+            adjacent = hinted(model.NewBoolVar(''), gap_value == 1)
+            model.Add(gap != 1).OnlyEnforceIf(adjacent.Not())
+            same_day = hinted(model.NewBoolVar(''), same_day_value)
+            model.Add(day[u] != day[v]).OnlyEnforceIf(same_day.Not())
+            penalised = hinted(model.NewBoolVar(''), gap_value == 1 and same_day_value)
+            model.AddBoolOr([adjacent.Not(), same_day.Not(), penalised])
+            back_to_back.append(weight * penalised)
+
+    # One slot less always beats any number of back-to-back exams
+    slot_weight = sum(weight for _, _, weight in network.edges(data='weight', default=1)) + 1
+    model.Minimize(slot_weight * used_slots + sum(back_to_back))
+    for variable, value in hints:
+        model.AddHint(variable, value)
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = time_limit
+    solver.parameters.num_search_workers = workers or os.cpu_count() or 1
+    status = _solve(solver, model, progress)
+    # The hint is only a fallback when it satisfies every constraint of the model
+    usable_hint = complete and _fits(network, hint, capacity)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return (dict(hint) if usable_hint else None), solver.StatusName(status)
+
+    # Never return anything worse than a complete, feasible hint
+    solved = {course: solver.Value(slot[course]) for course in courses}
+    if usable_hint and _cost(network, hint) <= _cost(network, solved):
+        return dict(hint), solver.StatusName(status)
+    return solved, solver.StatusName(status)
+
+def _cost(network, slots):
+    """(slots used, back-to-back exams) of a timetable, compared as the objective."""
+    return max(slots.values(), default=-1) + 1, back_to_back_students(network, slots)
+
+def _fits(network, slots, capacity):
+    """Whether the students examined in every slot fit in capacity seats (always when None)."""
+    if capacity is None:
+        return True
+    seated = {}
+    for course, s in slots.items():
+        seated[s] = seated.get(s, 0) + network.nodes[course].get('students', 0)
+    return all(students <= capacity for students in seated.values())
+
+def _solve(solver, model, progress):
+    """Run the solver, reporting progress from a watcher thread if asked."""
+    if progress is None:
+        return solver.Solve(model)
+
+    counter = _solution_counter()
+    finished = threading.Event()
+    errors = []
+
+    def watch():
+        start = time.perf_counter()
+        while not finished.wait(PROGRESS_INTERVAL):
+            try:
+                progress(solver_elapsed=time.perf_counter() - start, solutions=counter.solutions,
+                         objective=counter.objective)
+            except Exception as e:
+                errors.append(e)
+                solver.StopSearch()
+                return
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        status = solver.Solve(model, counter)
+    finally:
+        finished.set()
+        watcher.join()
+    if errors:
+        raise errors[0]
+    return status
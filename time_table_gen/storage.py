@@ -0,0 +1,169 @@
+from collections import OrderedDict
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+from conflicts import conflict_graph
+from common.ingest import EXTENSIONS, read_frame, receive
+from common.metrics import stage
+
+# Upload and generated-timetable directories, one sub-directory per id
+UPLOAD_DIR = 'uploads'
+ARTIFACT_DIR = 'artifacts'
+
+# Entries older than the TTL (seconds) or beyond the newest max_entries are evicted
+UPLOAD_TTL = 24 * 3600
+MAX_UPLOADS = 100
+ARTIFACT_TTL = 24 * 3600
+MAX_ARTIFACTS = 200
+
+# Parsed uploads kept in memory per process
+PARSED_CACHE_SIZE = 16
+
+_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+class ArtifactStore:
+    """Directories keyed by 32-hex-digit ids under one root, with eviction.
+
+    Everything lives on disk, so several worker processes sharing the root
+    see the same entries. Whenever an entry is created, entries older than
+    ttl seconds are removed, and then the oldest ones beyond max_entries.
+    """
+
+    def __init__(self, root, ttl, max_entries):
+        self.root = root
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def create(self, entry_id=None):
+        """Create an empty entry and return its id.
+
+        Args:
+            entry_id (str, optional): Id of the entry, 32 hex digits; a new
+                random one when None. An existing entry with this id is kept
+                and marked as new again.
+        """
+        self.evict()
+        entry_id = entry_id or uuid.uuid4().hex
+        path = os.path.join(self.root, entry_id)
+        os.makedirs(path, exist_ok=True)
+        os.utime(path)
+        return entry_id
+
+    def path(self, entry_id, name):
+        """Path of a file inside an entry.
+
+        Raises:
+            KeyError: If the id is malformed or the entry does not exist.
+        """
+        if not _ID_PATTERN.match(entry_id or '') or not os.path.isdir(os.path.join(self.root, entry_id)):
+            raise KeyError(entry_id)
+        return os.path.join(self.root, entry_id, name)
+
+    def evict(self):
+        """Remove expired entries and the oldest ones beyond max_entries."""
+        if not os.path.isdir(self.root):
+            return
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if _ID_PATTERN.match(name) and os.path.isdir(path):
+                entries.append((os.path.getmtime(path), path))
+        entries.sort(reverse=True)
+        expiry = time.time() - self.ttl
+        for i, (modified, path) in enumerate(entries):
+            if modified < expiry or i >= self.max_entries - 1:
+                shutil.rmtree(path, ignore_errors=True)
+
+class UploadStore:
+    """Uploaded student files keyed by upload id.
+
+    Files are kept in an ArtifactStore under an id derived from the SHA-256
+    of their bytes, so uploading the same file again returns the same id
+    and reuses what was parsed from it. The class network parsed from each
+    upload is cached in memory (least recently used first out), so
+    generating again with other rooms or slots, or uploading again, skips
+    parsing and the conflict product. Uploads may be CSV, Parquet or Arrow
+    files; they are written to disk as they arrive and read memory-mapped.
+    """
+
+    FILE_NAME = 'students'
+
+    def __init__(self, root=UPLOAD_DIR, ttl=UPLOAD_TTL, max_entries=MAX_UPLOADS, cache_size=PARSED_CACHE_SIZE):
+        self.files = ArtifactStore(root, ttl, max_entries)
+        self.cache_size = cache_size
+        self._parsed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, file):
+        """Store an uploaded file, check that it parses and return its id.
+
+        Raises:
+            ValueError: If the file has no 'uid' column.
+        """
+        with stage('save_upload'):
+            upload = receive(file, spool_dir=self.files.root, mmap_threshold=0)
+            try:
+                upload_id = self.files.create(upload.digest[:32])
+                path = self.files.path(upload_id, self.FILE_NAME + EXTENSIONS[upload.format])
+                if not os.path.isfile(path):
+                    upload.save(path)
+            finally:
+                upload.discard()  # Left over when the same file was already stored
+        try:
+            self.network(upload_id)
+        except ValueError:
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+            raise
+        return upload_id
+
+    def network(self, upload_id):
+        """Class network of an upload, parsed once per process.
+
+        The cached graph is shared; callers that modify it must copy it.
+        The upload's file is looked up on every call, cached or not, so an
+        upload evicted from disk by any worker is gone for all of them.
+
+        Raises:
+            KeyError: If the upload does not exist (or was evicted).
+            ValueError: If the file has no 'uid' column.
+        """
+        try:
+            path, fmt = self._file(upload_id)
+        except KeyError:
+            with self._lock:
+                self._parsed.pop(upload_id, None)
+            raise
+
+        with self._lock:
+            if upload_id in self._parsed:
+                self._parsed.move_to_end(upload_id)
+                return self._parsed[upload_id]
+
+        with stage('read_upload'):
+            student_data = read_frame(path, fmt)
+        if 'uid' not in student_data.columns:
+            raise ValueError("CSV file must contain a 'uid' column.")
+        with stage('conflict_graph'):
+            network = conflict_graph(student_data.set_index('uid'))
+
+        with self._lock:
+            self._parsed[upload_id] = network
+            while len(self._parsed) > self.cache_size:
+                self._parsed.popitem(last=False)
+        return network
+
+    def _file(self, upload_id):
+        """Path and format of the file of an upload.
+
+        Raises:
+            KeyError: If the upload does not exist (or was evicted).
+        """
+        for fmt, extension in EXTENSIONS.items():
+            path = self.files.path(upload_id, self.FILE_NAME + extension)
+            if os.path.isfile(path):
+                return path, fmt
+        raise KeyError(upload_id)